@@ -0,0 +1,131 @@
+from collections import defaultdict
+
+AGGREGATE_FIELDS = ("customers", "churn", "not_churn", "predictions")
+
+
+# Kontribusi satu dokumen prediksi ke agregat (user_id, month).
+# Mengikuti perhitungan lama di /dashboard/chart dan /dashboard/informations.
+def prediction_delta(record):
+    is_churn = record.get("is_churn", None)
+    churn_count = record.get("churn_count", None)
+    customers = record.get("total_customers", 1)
+
+    churn = 0
+    not_churn = 0
+    if is_churn is not None:
+        if is_churn:
+            churn += customers
+        else:
+            not_churn += customers
+    elif churn_count is not None:
+        not_churn += customers - churn_count
+    if churn_count is not None:
+        churn += churn_count
+
+    return record.get("month", "") or "", {
+        "customers": customers,
+        "churn": churn,
+        "not_churn": not_churn,
+        "predictions": 1,
+    }
+
+
+def compute_aggregates(records):
+    aggregates = defaultdict(lambda: defaultdict(lambda: dict.fromkeys(AGGREGATE_FIELDS, 0)))
+    for record in records:
+        user_id = record.get("user_id")
+        if not user_id:
+            continue
+        month, delta = prediction_delta(record)
+        row = aggregates[user_id][month]
+        for field, value in delta.items():
+            row[field] += value
+    return {user_id: dict(months) for user_id, months in aggregates.items()}
+
+
+def chart_summary(aggregates):
+    total_customers = 0
+    total_churn = 0
+    churn_data_per_month = {}
+    total_customers_per_month = {}
+
+    for row in aggregates:
+        month = row.get("month", "")
+        total_customers += row["customers"]
+        total_churn += row["churn"]
+        if month:
+            churn_data_per_month[month] = row["churn"]
+            total_customers_per_month[month] = row["customers"]
+
+    # bar chart
+    churn_rate_per_month = []
+    for month in sorted(churn_data_per_month):
+        churn_rate = (churn_data_per_month[month] / total_customers_per_month[month]) * 100
+        churn_rate_per_month.append({
+            "month": month,
+            "churn_rate": round(churn_rate, 2)
+        })
+
+    # pie chart
+    churn_percent = round((total_churn / total_customers) * 100, 2) if total_customers > 0 else 0
+    not_churn_percent = 100 - churn_percent
+
+    return {
+        "pie_chart": {
+            "churn": churn_percent,
+            "not_churn": not_churn_percent
+        },
+        "bar_chart": churn_rate_per_month,
+        "total_customer": total_customers,
+        "total_churn": total_churn,
+        "churn_data_per_month": churn_data_per_month,
+        "total_customer_per_month": total_customers_per_month
+    }
+
+
+def informations_summary(aggregates):
+    total_customers = 0
+    total_churn = 0
+    total_not_churn = 0
+    predictions_per_month = {}
+
+    for row in aggregates:
+        month = row.get("month", "")
+        total_customers += row["customers"]
+        # dokumen tanpa month hanya dihitung di total_customers
+        if not month:
+            continue
+        total_churn += row["churn"]
+        total_not_churn += row["not_churn"]
+        predictions_per_month[month] = row["predictions"]
+
+    return {
+        "information": {
+            "total_customers": total_customers,
+            "total_churn": total_churn,
+            "total_not_churn": total_not_churn,
+            "total_predictions_per_month": [
+                {
+                    "month": month,
+                    "total_predictions": predictions_per_month[month]
+                }
+                for month in sorted(predictions_per_month)
+            ],
+        }
+    }
+
+
+def backfill(store):
+    # Bangun ulang semua agregat dari koleksi predictions (dijalankan sekali).
+    # Agregasi dihitung di sisi storage per user, bukan dengan membaca semua dokumen.
+    users = store.prediction_users()
+    for user_id in users:
+        months = {row["month"]: row for row in store.aggregate_predictions(user_id)}
+        store.replace_aggregates(user_id, months)
+    return len(users)
+
+
+if __name__ == "__main__":
+    from storage import create_store
+
+    print(f"Rebuilt dashboard aggregates for {backfill(create_store())} users")
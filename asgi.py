@@ -0,0 +1,17 @@
+import os
+
+# Mode serving ASGI: uvicorn asgi:app  atau  gunicorn -k uvicorn.workers.UvicornWorker asgi:app
+# Koneksi diterima oleh event loop. Route Flask yang sama (response tidak berubah)
+# dijalankan di thread pool terbatas (ASGI_THREADS), jadi request yang sedang menunggu
+# Firestore/Storage hanya memakai satu thread, bukan satu proses worker.
+# Scoring model dipisah ke executor sendiri seukuran jumlah core.
+os.environ.setdefault("SCORING_WORKERS", str(os.cpu_count() or 1))
+
+from a2wsgi import WSGIMiddleware
+
+import main
+
+ASGI_THREADS = int(os.getenv("ASGI_THREADS", "256"))
+ASGI_SEND_QUEUE_SIZE = int(os.getenv("ASGI_SEND_QUEUE_SIZE", "10"))
+
+app = WSGIMiddleware(main.app, workers=ASGI_THREADS, send_queue_size=ASGI_SEND_QUEUE_SIZE)
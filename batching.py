@@ -0,0 +1,131 @@
+import queue
+import threading
+import time
+
+import numpy as np
+
+
+class _Pending:
+    __slots__ = ("row", "enqueued_at", "done", "result", "error")
+
+    def __init__(self, row):
+        self.row = row
+        self.enqueued_at = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+# Menggabungkan baris dari request yang bersamaan menjadi satu matrix
+# sehingga predict_proba cukup dipanggil sekali per batch
+class MicroBatcher:
+    def __init__(self, model, max_batch_size=32, max_wait_ms=5):
+        self.model = model
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        # close() dan put() di predict() saling eksklusif: setiap baris yang masuk
+        # antrian sebelum sentinel pasti diproses worker
+        self._close_lock = threading.Lock()
+        self._closed = False
+        self._stats = {
+            "batches": 0,
+            "rows": 0,
+            "full_batches": 0,
+            "max_batch_rows": 0,
+            "queue_wait_ms_total": 0.0,
+            "queue_wait_ms_max": 0.0,
+        }
+        self._worker = threading.Thread(target=self._run, name="predict-batcher", daemon=True)
+        self._worker.start()
+
+    def predict(self, row):
+        # row: array 1xN, disalin karena buffer encoder dipakai ulang
+        pending = _Pending(np.array(row, dtype=np.float32, copy=True).reshape(-1))
+        with self._close_lock:
+            closed = self._closed
+            if not closed:
+                self._queue.put(pending)
+        if closed:
+            # batcher lama (model sudah diganti): nilai langsung tanpa batching
+            return float(self.model.predict_proba(pending.row.reshape(1, -1))[0, 1])
+        pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def _collect(self):
+        # None di antrian = sentinel dari close()
+        first = self._queue.get()
+        if first is None:
+            return [], True
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                pending = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if pending is None:
+                return batch, True
+            batch.append(pending)
+        return batch, False
+
+    def _run(self):
+        while True:
+            batch, stop = self._collect()
+            if batch:
+                self._score(batch)
+            if stop:
+                return
+
+    def _score(self, batch):
+        started = time.perf_counter()
+        try:
+            proba = self.model.predict_proba(np.stack([p.row for p in batch]))[:, 1]
+            for pending, value in zip(batch, proba):
+                pending.result = float(value)
+        except Exception as e:
+            for pending in batch:
+                pending.error = e
+        finally:
+            self._record(batch, started)
+            for pending in batch:
+                pending.done.set()
+
+    def _record(self, batch, started):
+        waits = [(started - p.enqueued_at) * 1000.0 for p in batch]
+        with self._lock:
+            stats = self._stats
+            stats["batches"] += 1
+            stats["rows"] += len(batch)
+            if len(batch) >= self.max_batch_size:
+                stats["full_batches"] += 1
+            stats["max_batch_rows"] = max(stats["max_batch_rows"], len(batch))
+            stats["queue_wait_ms_total"] += sum(waits)
+            stats["queue_wait_ms_max"] = max(stats["queue_wait_ms_max"], max(waits))
+
+    def close(self):
+        # worker menyelesaikan baris yang sudah mengantri lalu berhenti
+        with self._close_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        batches = stats["batches"]
+        rows = stats["rows"]
+        stats["max_batch_size"] = self.max_batch_size
+        stats["max_wait_ms"] = self.max_wait * 1000.0
+        stats["queue_depth"] = self._queue.qsize()
+        stats["avg_batch_rows"] = round(rows / batches, 2) if batches else 0
+        stats["avg_batch_fill"] = round(rows / (batches * self.max_batch_size), 4) if batches else 0
+        stats["avg_queue_wait_ms"] = round(stats["queue_wait_ms_total"] / rows, 3) if rows else 0
+        return stats
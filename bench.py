@@ -0,0 +1,424 @@
+import argparse
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+# Benchmark offline: Firebase diganti MemoryStore (lihat storage.py)
+#   python bench.py [--output bench_micro.json] micro
+#   python bench.py load --rate 50 --duration 30 [--requests traffic.jsonl] [--url http://localhost:5000]
+#   python bench.py parallel --rows 2000000 --workers 1 2 4 8
+# Hasil berupa JSON agar bisa dibandingkan antar commit.
+os.environ.setdefault("STORAGE_BACKEND", "memory")
+
+PREDICT_ROWS = (1, 100, 10_000, 1_000_000)
+USERS = 20
+MONTHS = [f"2025-{month:02d}" for month in range(1, 13)]
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    return round(float(np.percentile(values, q)), 4)
+
+
+def measure(fn, repeat, *args):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(*args)
+        timings.append((time.perf_counter() - started) * 1000.0)
+    return {
+        "repeat": repeat,
+        "median_ms": round(statistics.median(timings), 4),
+        "p95_ms": percentile(timings, 95),
+        "min_ms": round(min(timings), 4),
+    }
+
+
+def metadata():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "storage_backend": os.environ.get("STORAGE_BACKEND"),
+    }
+
+
+def sample_payload(bundle, rng, user_id="bench-user"):
+    # payload /predict sintetis dengan nilai kategori yang valid
+    payload = {"id": user_id}
+    for col in bundle.columns:
+        if col in bundle.encoder:
+            classes = bundle.encoder[col].classes_
+            payload[col] = str(classes[rng.integers(0, len(classes))])
+        else:
+            payload[col] = round(float(rng.uniform(0, 100)), 2)
+    return payload
+
+
+def sample_frame(bundle, rows, seed=0):
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    data = {"customer_id": [f"C{i:08d}" for i in range(rows)]}
+    for col in bundle.columns:
+        if col in bundle.encoder:
+            classes = np.asarray(bundle.encoder[col].classes_).astype(str)
+            data[col] = classes[rng.integers(0, len(classes), rows)]
+        else:
+            data[col] = rng.uniform(0, 100, rows).round(2)
+    return pd.DataFrame(data)
+
+
+def sample_predictions(n, seed=0):
+    rng = np.random.default_rng(seed)
+    records = []
+    for i in range(n):
+        month = MONTHS[i % len(MONTHS)]
+        record = {
+            "user_id": f"user-{i % USERS}",
+            "month": month,
+            "timestamp": f"{month}-{1 + i % 28:02d}T00:00:{i % 60:02d}",
+        }
+        if i % 10 == 0:
+            total = int(rng.integers(100, 1000))
+            record.update({"input_source": "Upload file", "total_customers": total, "churn_count": total // 4})
+        else:
+            record.update({"input_source": "manual", "is_churn": bool(rng.random() < 0.3)})
+        records.append(record)
+    return records
+
+
+def bench_upload_parsing(main, bundle, rows):
+    from openpyxl import Workbook
+
+    scoring = main.components.get("scoring")
+    frame = sample_frame(bundle, rows)
+    wanted = bundle.columns + [main.REASON_COLUMN] + main.UPLOAD_ID_COLUMNS
+
+    csv_bytes = frame.to_csv(index=False).encode("utf-8")
+    xlsx_rows = min(rows, 20_000)
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(list(frame.columns))
+    for row in frame.head(xlsx_rows).itertuples(index=False):
+        sheet.append([value.item() if hasattr(value, "item") else value for value in row])
+    xlsx_file = io.BytesIO()
+    workbook.save(xlsx_file)
+    xlsx_bytes = xlsx_file.getvalue()
+
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    parquet_file = io.BytesIO()
+    pq.write_table(table, parquet_file)
+    arrow_file = io.BytesIO()
+    feather.write_feather(table, arrow_file, compression="uncompressed")
+
+    def parse(data, filename, engine):
+        chunks = scoring.iter_chunks(
+            io.BytesIO(data), filename, main.UPLOAD_CHUNK_SIZE, wanted=wanted,
+            dtypes=bundle.feature_encoder.dtypes, csv_engine=engine,
+        )
+        for _ in chunks:
+            pass
+
+    def parse_and_score(data, filename, engine):
+        chunks = scoring.iter_chunks(
+            io.BytesIO(data), filename, main.UPLOAD_CHUNK_SIZE, wanted=wanted,
+            dtypes=bundle.feature_encoder.dtypes, csv_engine=engine,
+        )
+        scoring.score_chunks(chunks, bundle.feature_encoder, bundle.scorer.predict_proba, bundle.threshold)
+
+    cases = (
+        ("csv_pandas", "csv", "pandas", csv_bytes, rows),
+        ("csv_pyarrow", "csv", "pyarrow", csv_bytes, rows),
+        ("parquet", "parquet", None, parquet_file.getvalue(), rows),
+        ("arrow", "arrow", None, arrow_file.getvalue(), rows),
+        ("xlsx", "xlsx", None, xlsx_bytes, xlsx_rows),
+    )
+    results = {}
+    for name, ext, engine, data, n in cases:
+        parsed = measure(parse, 3, data, f"bench.{ext}", engine or "pyarrow")
+        scored = measure(parse_and_score, 3, data, f"bench.{ext}", engine or "pyarrow")
+        results[name] = {
+            "rows": n,
+            "bytes": len(data),
+            "parse": parsed,
+            "parse_rows_per_s": round(n / (parsed["median_ms"] / 1000.0)),
+            "parse_s_per_million_rows": round(parsed["median_ms"] / 1000.0 / n * 1_000_000, 3),
+            "parse_and_score": scored,
+        }
+    return results
+
+
+def bench_dashboard(main, n):
+    from aggregates import chart_summary, compute_aggregates, informations_summary
+
+    records = sample_predictions(n)
+    store = main.components.get("store")
+    store.add_predictions(records)
+    aggregates = compute_aggregates(records)
+    user_rows = [{"month": month, **row} for month, row in aggregates["user-0"].items()]
+
+    client = main.app.test_client()
+
+    def chart_endpoint():
+        # cache dimatikan per panggilan agar yang diukur adalah agregasinya
+        main.response_cache.invalidate_user("user-0")
+        client.get("/dashboard/chart?id=user-0")
+
+    return {
+        "predictions": n,
+        "compute_aggregates": measure(compute_aggregates, 3, records),
+        "chart_summary": measure(chart_summary, 1000, user_rows),
+        "informations_summary": measure(informations_summary, 1000, user_rows),
+        "dashboard_chart_endpoint": measure(chart_endpoint, 200),
+    }
+
+
+def bench_wordcloud(main):
+    rng = np.random.default_rng(0)
+    words = [f"kata{i}" for i in range(main.WORDCLOUD_VOCAB_SIZE)]
+    frequencies = {word: int(count) for word, count in zip(words, rng.zipf(1.5, len(words)))}
+    results = {}
+    for quality in main.WORDCLOUD_RENDER_MODES:
+        main.render_wordcloud(frequencies, quality)
+        results[quality] = measure(main.render_wordcloud, 5, frequencies, quality)
+    return results
+
+
+def run_micro(args):
+    import main
+
+    bundle = main.models.active
+    rng = np.random.default_rng(0)
+    payload = {k.lower(): v for k, v in sample_payload(bundle, rng).items()}
+
+    from booster import reference_matrix
+
+    predict = {}
+    for rows in args.predict_rows:
+        input_data = reference_matrix(bundle.encoder, bundle.columns, rows, seed=rows)
+        repeat = max(2, min(500, 1_000_000 // (rows * 10) or 2))
+        predict[str(rows)] = measure(bundle.scorer.predict_proba, repeat, input_data)
+
+    return {
+        "meta": metadata(),
+        "model": {"name": bundle.name, "version": bundle.version},
+        "encode_input": measure(main.encode_input, 10_000, payload, bundle),
+        "predict_proba": predict,
+        "upload_parsing": bench_upload_parsing(main, bundle, args.upload_rows),
+        "wordcloud": bench_wordcloud(main),
+        "dashboard": bench_dashboard(main, args.predictions),
+    }
+
+
+def run_parallel(args):
+    # skala scoring upload CSV dari 1 ke N proses, dibandingkan jalur satu proses
+    import tempfile
+
+    import main
+    from parallel import ParallelScorer
+
+    bundle = main.models.active
+    scoring = main.components.get("scoring")
+    wanted = bundle.columns + [main.REASON_COLUMN]
+    with tempfile.NamedTemporaryFile("wb", suffix=".csv", delete=False) as tmp:
+        path = tmp.name
+        for start in range(0, args.rows, 100_000):
+            frame = sample_frame(bundle, min(100_000, args.rows - start), seed=start)
+            tmp.write(frame.to_csv(index=False, header=start == 0).encode("utf-8"))
+
+    try:
+        started = time.perf_counter()
+        with open(path, "rb") as f:
+            chunks = scoring.iter_chunks(f, "bench.csv", main.UPLOAD_CHUNK_SIZE, wanted=wanted)
+            expected = scoring.score_chunks(chunks, bundle.feature_encoder, bundle.scorer.predict_proba, bundle.threshold)
+        single_s = time.perf_counter() - started
+
+        runs = []
+        for workers in args.workers:
+            scorer = ParallelScorer(
+                main.models.paths[bundle.name], bundle.scorer is not bundle.model, bundle.threshold,
+                main.CLUSTERING_MODEL_PATH, workers, chunksize=main.UPLOAD_CHUNK_SIZE,
+                range_bytes=args.range_mb << 20,
+            )
+            try:
+                # pool dipanaskan dulu (spawn + load model) agar yang diukur hanya scoring
+                scorer.score_csv(path, main.REASON_COLUMN)
+                started = time.perf_counter()
+                total, churn, _, _ = scorer.score_csv(path, main.REASON_COLUMN)
+                elapsed = time.perf_counter() - started
+            finally:
+                scorer.close()
+            runs.append({
+                "workers": workers,
+                "seconds": round(elapsed, 3),
+                "rows_per_s": round(total / elapsed),
+                "speedup_vs_single": round(single_s / elapsed, 2),
+                "counts_match": (total, churn) == expected,
+            })
+    finally:
+        os.remove(path)
+
+    return {
+        "meta": metadata(),
+        "rows": args.rows,
+        "single_process": {"seconds": round(single_s, 3), "rows_per_s": round(args.rows / single_s)},
+        "parallel": runs,
+    }
+
+
+def load_payloads(path):
+    payloads = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            # baris boleh berupa body /predict langsung atau {"body": {...}}
+            payloads.append(item.get("body", item) if isinstance(item, dict) else item)
+    return payloads
+
+
+def http_sender(url):
+    def send(payload):
+        request = urllib.request.Request(
+            f"{url.rstrip('/')}/predict",
+            data=json.dumps(payload).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+    return send
+
+
+def in_process_sender():
+    import main
+
+    local = threading.local()
+
+    def send(payload):
+        client = getattr(local, "client", None)
+        if client is None:
+            client = local.client = main.app.test_client()
+        return client.post("/predict", json=payload).status_code
+    return send
+
+
+def run_load(args):
+    if args.requests:
+        payloads = load_payloads(args.requests)
+    else:
+        import main
+
+        rng = np.random.default_rng(0)
+        bundle = main.models.active
+        payloads = [sample_payload(bundle, rng, f"user-{i % USERS}") for i in range(1000)]
+    if not payloads:
+        sys.exit("No payloads to replay")
+
+    send = http_sender(args.url) if args.url else in_process_sender()
+    total = int(args.rate * args.duration)
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+
+    def fire(payload, scheduled):
+        try:
+            status = send(payload)
+        except Exception as e:
+            status = type(e).__name__
+        # latency dihitung dari jadwal kirim (open-loop) agar antrian ikut terukur
+        elapsed_ms = (time.perf_counter() - scheduled) * 1000.0
+        with lock:
+            latencies.append(elapsed_ms)
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        for i in range(total):
+            scheduled = started + i / args.rate
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(fire, payloads[i % len(payloads)], scheduled)
+    elapsed = time.perf_counter() - started
+
+    return {
+        "meta": metadata(),
+        "target": args.url or "in-process",
+        "target_rate": args.rate,
+        "duration_s": round(elapsed, 3),
+        "requests": len(latencies),
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+        "status_codes": statuses,
+        "latency_ms": {
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "max": round(max(latencies), 4) if latencies else None,
+        },
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the StaySense API")
+    parser.add_argument("--output", help="write JSON results to this file instead of stdout")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    micro = commands.add_parser("micro")
+    micro.add_argument("--predict-rows", type=int, nargs="+", default=list(PREDICT_ROWS))
+    micro.add_argument("--upload-rows", type=int, default=100_000)
+    micro.add_argument("--predictions", type=int, default=100_000)
+
+    load = commands.add_parser("load")
+    load.add_argument("--requests", help="JSONL file with one /predict body per line (default: synthetic payloads)")
+    load.add_argument("--url", help="base URL of a running server (default: in-process app with MemoryStore)")
+    load.add_argument("--rate", type=float, default=50.0, help="requests per second")
+    load.add_argument("--duration", type=float, default=30.0, help="seconds")
+    load.add_argument("--concurrency", type=int, default=64)
+
+    parallel = commands.add_parser("parallel")
+    parallel.add_argument("--rows", type=int, default=2_000_000)
+    parallel.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count() or 1])
+    parallel.add_argument("--range-mb", type=int, default=16)
+
+    args = parser.parse_args()
+    runners = {"micro": run_micro, "load": run_load, "parallel": run_parallel}
+    results = runners[args.command](args)
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
@@ -0,0 +1,111 @@
+import json
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+
+
+# Scoring lewat Booster XGBoost native (inplace_predict) tanpa lapisan sklearn
+# dan tanpa membuat DMatrix per panggilan
+class NativeBoosterScorer:
+    def __init__(self, model, nthread=1, model_file=None):
+        import xgboost
+
+        if model_file and os.path.exists(model_file):
+            booster = xgboost.Booster(model_file=model_file)
+        else:
+            booster = model.get_booster()
+            if model_file:
+                booster.save_model(model_file)
+        booster.set_param({"nthread": int(nthread)})
+        self.booster = booster
+        self.nthread = int(nthread)
+
+        # samakan jumlah tree yang dipakai dengan XGBClassifier.predict_proba
+        try:
+            self.iteration_range = (0, int(model.best_iteration) + 1)
+        except AttributeError:
+            self.iteration_range = (0, 0)
+
+    def predict_proba(self, input_data):
+        input_data = np.ascontiguousarray(input_data, dtype=np.float32)
+        proba = self.booster.inplace_predict(input_data, iteration_range=self.iteration_range)
+        if proba.ndim == 2:
+            return proba
+        return np.column_stack([1.0 - proba, proba])
+
+
+def reference_matrix(label_encoders, columns, n_rows, seed=0):
+    # data sintetis: kode kategori valid untuk kolom kategorikal, angka acak untuk sisanya
+    rng = np.random.default_rng(seed)
+    data = np.empty((n_rows, len(columns)), dtype=np.float32)
+    for slot, col in enumerate(columns):
+        if col in label_encoders:
+            data[:, slot] = rng.integers(0, len(label_encoders[col].classes_), n_rows)
+        else:
+            data[:, slot] = rng.uniform(0, 100, n_rows)
+    return data
+
+
+def max_divergence(model, scorer, input_data):
+    expected = model.predict_proba(input_data)[:, 1]
+    actual = scorer.predict_proba(input_data)[:, 1]
+    return float(np.max(np.abs(expected - actual))) if len(expected) else 0.0
+
+
+def _latency_ms(fn, input_data, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(input_data)
+        timings.append((time.perf_counter() - started) * 1000.0)
+    return {
+        "median_ms": round(statistics.median(timings), 4),
+        "min_ms": round(min(timings), 4),
+        "max_ms": round(max(timings), 4),
+    }
+
+
+def benchmark(model, scorer, label_encoders, columns, single_repeat=2000, batch_rows=100_000, batch_repeat=5):
+    single = reference_matrix(label_encoders, columns, 1, seed=1)
+    batch = reference_matrix(label_encoders, columns, batch_rows, seed=2)
+    return {
+        "nthread": scorer.nthread,
+        "max_divergence": max_divergence(model, scorer, batch),
+        "single_row": {
+            "sklearn": _latency_ms(model.predict_proba, single, single_repeat),
+            "native": _latency_ms(scorer.predict_proba, single, single_repeat),
+        },
+        f"{batch_rows}_rows": {
+            "sklearn": _latency_ms(model.predict_proba, batch, batch_repeat),
+            "native": _latency_ms(scorer.predict_proba, batch, batch_repeat),
+        },
+    }
+
+
+if __name__ == "__main__":
+    # python booster.py export [model/model_xgboost.ubj]
+    # python booster.py bench [nthread]
+    import joblib
+
+    bundle = joblib.load(os.path.join("model", "model_xgboost.pkl"))
+    command = sys.argv[1] if len(sys.argv) > 1 else "bench"
+
+    if command == "export":
+        model_file = sys.argv[2] if len(sys.argv) > 2 else os.path.join("model", "model_xgboost.ubj")
+        if os.path.exists(model_file):
+            os.remove(model_file)
+        scorer = NativeBoosterScorer(bundle["model"], model_file=model_file)
+        reference = reference_matrix(bundle["label_encoders"], bundle["columns"], 10_000)
+        print(json.dumps({
+            "model_file": model_file,
+            "max_divergence": max_divergence(bundle["model"], scorer, reference),
+        }, indent=2))
+    elif command == "bench":
+        nthread = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+        scorer = NativeBoosterScorer(bundle["model"], nthread=nthread)
+        print(json.dumps(benchmark(bundle["model"], scorer, bundle["label_encoders"], bundle["columns"]), indent=2))
+    else:
+        sys.exit(f"Unknown command: {command}")
@@ -0,0 +1,248 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+_MISSING = object()
+
+
+# Pengganti shared cache (mis. Redis) di dalam proses, untuk dev dan benchmark
+class MemorySharedCache:
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl if ttl else None, value)
+
+    def incr(self, key):
+        with self._lock:
+            _, value = self._data.get(key, (None, 0))
+            self._data[key] = (None, int(value) + 1)
+            return int(value) + 1
+
+
+class RedisSharedCache:
+    def __init__(self, url):
+        import redis
+
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        value = self._client.get(key)
+        return None if value is None else value.decode()
+
+    def set(self, key, value, ttl=None):
+        self._client.set(key, value, ex=int(ttl) if ttl else None)
+
+    def incr(self, key):
+        return self._client.incr(key)
+
+
+def create_shared_cache(spec):
+    if not spec:
+        return None
+    if spec == "memory":
+        return MemorySharedCache()
+    if spec.startswith(("redis://", "rediss://")):
+        return RedisSharedCache(spec)
+    raise ValueError(f"Unknown RESPONSE_CACHE_SHARED: {spec}")
+
+
+# Cache LRU + TTL untuk response GET, key = (endpoint, user_id).
+# Jika ada shared cache, setiap user punya nomor generasi di shared cache
+# sehingga invalidasi dari satu worker juga berlaku di worker lain.
+class ResponseCache:
+    def __init__(self, max_entries=1024, ttl=60, shared=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.shared = shared
+        self._entries = OrderedDict()
+        # jumlah invalidasi lokal per user, untuk mendeteksi invalidasi selama build()
+        self._invalidated = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            "hits": 0,
+            "shared_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "invalidations": 0,
+            "stale_sets": 0,
+        }
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _generation(self, user_id):
+        if self.shared is None:
+            return 0
+        return int(self.shared.get(f"gen:{user_id}") or 0)
+
+    # mengembalikan (value, generation); generation diteruskan ke set() agar
+    # value yang dibangun sebelum invalidasi tidak disimpan
+    def get(self, endpoint, user_id):
+        if not self.enabled:
+            return None, None
+        generation = self._generation(user_id)
+        key = (endpoint, user_id)
+        with self._lock:
+            local_generation = self._invalidated.get(user_id, 0)
+            entry = self._entries.get(key, _MISSING)
+            if entry is not _MISSING:
+                expires_at, entry_generation, value = entry
+                if expires_at < time.monotonic():
+                    del self._entries[key]
+                    self._stats["expirations"] += 1
+                elif entry_generation != generation:
+                    del self._entries[key]
+                else:
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return value, None
+
+        if self.shared is not None:
+            raw = self.shared.get(f"resp:{user_id}:{generation}:{endpoint}")
+            if raw is not None:
+                value = json.loads(raw)
+                self._store_local(key, (local_generation, generation), value)
+                self._count("shared_hits")
+                return value, None
+
+        self._count("misses")
+        return None, (local_generation, generation)
+
+    def _store_local(self, key, generation, value):
+        local_generation, generation = generation
+        with self._lock:
+            if self._invalidated.get(key[1], 0) != local_generation:
+                self._stats["stale_sets"] += 1
+                return False
+            self._entries[key] = (time.monotonic() + self.ttl, generation, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+        return True
+
+    def set(self, endpoint, user_id, value, generation):
+        # generation dari get(); bila user diinvalidasi sejak itu, value tidak disimpan
+        if not self.enabled or generation is None:
+            return
+        if not self._store_local((endpoint, user_id), generation, value):
+            return
+        if self.shared is not None:
+            # key memakai generasi saat get(), sehingga value lama tidak terbaca setelah incr
+            self.shared.set(f"resp:{user_id}:{generation[1]}:{endpoint}", json.dumps(value), self.ttl)
+
+    def invalidate_user(self, user_id):
+        if not self.enabled:
+            return
+        with self._lock:
+            for key in [key for key in self._entries if key[1] == user_id]:
+                del self._entries[key]
+            self._invalidated[user_id] = self._invalidated.get(user_id, 0) + 1
+            self._stats["invalidations"] += 1
+        if self.shared is not None:
+            self.shared.incr(f"gen:{user_id}")
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        lookups = stats["hits"] + stats["shared_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["hits"] + stats["shared_hits"]) / lookups, 4) if lookups else 0
+        stats["max_entries"] = self.max_entries
+        stats["ttl_seconds"] = self.ttl
+        stats["shared"] = self.shared is not None
+        return stats
+
+
+# Cache LRU probabilitas churn, key = hash dari vektor fitur yang sudah di-encode.
+# Cache hanya berlaku untuk satu versi model; begitu versi model aktif berganti,
+# isinya dikosongkan.
+class PredictionCache:
+    def __init__(self, max_entries=100_000):
+        self.max_entries = max_entries
+        self.version = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "invalidations": 0,
+            "upload_rows": 0,
+            "upload_unique_rows": 0,
+        }
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    @staticmethod
+    def key(input_data):
+        return hashlib.blake2b(np.ascontiguousarray(input_data).tobytes(), digest_size=16).digest()
+
+    def get(self, version, key):
+        with self._lock:
+            if version != self.version:
+                if self._entries:
+                    self._stats["invalidations"] += 1
+                self._entries.clear()
+                self.version = version
+            value = self._entries.get(key)
+            if value is None:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return value
+
+    def set(self, version, key, value):
+        with self._lock:
+            # hasil dari model lama (request yang masih berjalan saat model diganti) tidak disimpan
+            if version != self.version:
+                return
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def record_dedupe(self, rows, unique_rows):
+        with self._lock:
+            self._stats["upload_rows"] += rows
+            self._stats["upload_unique_rows"] += unique_rows
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0
+        rows = stats["upload_rows"]
+        stats["upload_duplicate_rate"] = round(1 - stats["upload_unique_rows"] / rows, 4) if rows else 0
+        stats["max_entries"] = self.max_entries
+        stats["model_version"] = self.version
+        return stats
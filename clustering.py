@@ -0,0 +1,29 @@
+import numpy as np
+
+
+# Clustering alasan churn: TF-IDF vectorizer + KMeans dari kmeans7_model_joblib.pkl.
+# Teks diproses per batch sebagai matrix sparse.
+class ReasonClusterer:
+    def __init__(self, bundle, batch_size=1000):
+        self.model = bundle["model"]
+        self.vectorizer = bundle["vectorizer"]
+        self.n_clusters = int(self.model.n_clusters)
+        self.batch_size = batch_size
+
+    def count_clusters(self, texts):
+        counts = np.zeros(self.n_clusters, dtype=np.int64)
+        batch = []
+        for text in texts:
+            if not isinstance(text, str) or not text.strip():
+                continue
+            batch.append(text)
+            if len(batch) >= self.batch_size:
+                counts += self._predict_counts(batch)
+                batch = []
+        if batch:
+            counts += self._predict_counts(batch)
+        return {cluster: int(count) for cluster, count in enumerate(counts) if count}
+
+    def _predict_counts(self, texts):
+        labels = self.model.predict(self.vectorizer.transform(texts))
+        return np.bincount(labels, minlength=self.n_clusters)
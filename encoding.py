@@ -0,0 +1,106 @@
+import numbers
+import threading
+
+import numpy as np
+
+
+# Encoder dikompilasi sekali saat startup: lookup dict per kolom kategorikal
+# (pengganti LabelEncoder.transform) dan slot kolom yang tetap di buffer float32
+class FeatureEncoder:
+    def __init__(self, label_encoders, columns):
+        self.columns = list(columns)
+        self.encoders = label_encoders
+        self.slots = {col: i for i, col in enumerate(self.columns)}
+        # nilai valid per kolom sebagai list Python, dipakai lookup, pesan error dan /valid-values
+        self.valid_values = {col: le.classes_.tolist() for col, le in label_encoders.items()}
+        self.lookups = {
+            col: {value: code for code, value in enumerate(values)}
+            for col, values in self.valid_values.items()
+        }
+        # tipe kolom yang sudah pasti, dipakai parser upload: kategori (string) atau float32
+        self.dtypes = {}
+        for col in self.columns:
+            lookup = self.lookups.get(col)
+            if lookup is None:
+                self.dtypes[col] = "float32"
+            elif all(isinstance(value, str) for value in lookup):
+                self.dtypes[col] = "category"
+        # (kolom, slot, lookup) -> None untuk kolom numerik
+        self._layout = [(col, self.slots[col], self.lookups.get(col)) for col in self.columns]
+        self._local = threading.local()
+
+    def _row_buffer(self):
+        row = getattr(self._local, "row", None)
+        if row is None:
+            row = np.empty((1, len(self.columns)), dtype=np.float32)
+            self._local.row = row
+        return row
+
+    def invalid_value_message(self, col, val):
+        return f"Invalid value '{val}' for column '{col}'. Expected one of: {self.valid_values[col]}"
+
+    def invalid_values_message(self, col, values):
+        return f"Invalid values in column '{col}': {values}. Expected one of: {self.valid_values[col]}"
+
+    def encode_row(self, data_dict):
+        # buffer dipakai ulang per thread, jangan disimpan oleh pemanggil
+        row = self._row_buffer()
+        for col, slot, lookup in self._layout:
+            val = data_dict.get(col)
+            if val is None:
+                raise ValueError(f"Missing required input: '{col}'")
+
+            if lookup is not None:
+                try:
+                    code = lookup.get(val)
+                except TypeError:
+                    code = None
+                if code is None:
+                    raise ValueError(self.invalid_value_message(col, val))
+                val = code
+            elif isinstance(val, str):
+                lowered = val.strip().lower()
+                if lowered in ("yes", "no"):
+                    val = 1 if lowered == "yes" else 0
+                else:
+                    try:
+                        val = float(val)
+                    except ValueError:
+                        raise ValueError(f"Invalid non-numeric input after encoding: {val}")
+            elif not isinstance(val, numbers.Real):
+                # objek/list JSON tidak bisa dimasukkan ke slot numerik
+                raise ValueError(f"Invalid non-numeric input after encoding: {val}")
+
+            row[0, slot] = val
+
+        return row
+
+    def encode_rows(self, records):
+        # validasi per record: record yang gagal dicatat di errors (index -> pesan),
+        # baris valid dikumpulkan dalam satu matriks untuk scoring sekaligus
+        out = np.empty((len(records), len(self.columns)), dtype=np.float32)
+        valid = []
+        errors = {}
+        for i, data_dict in enumerate(records):
+            try:
+                out[len(valid)] = self.encode_row(data_dict)[0]
+            except ValueError as e:
+                errors[i] = str(e)
+                continue
+            valid.append(i)
+        return out[:len(valid)], valid, errors
+
+    def encode_frame(self, df):
+        out = np.empty((len(df), len(self.columns)), dtype=np.float32)
+        for col, slot, lookup in self._layout:
+            series = df[col]
+            if lookup is not None:
+                codes = series.map(lookup)
+                invalid = codes.isna()
+                if invalid.any():
+                    unknown_vals = series[invalid].unique().tolist()
+                    raise ValueError(self.invalid_values_message(col, unknown_vals))
+                out[:, slot] = codes.to_numpy(dtype=np.float32)
+            else:
+                out[:, slot] = series.to_numpy(dtype=np.float32)
+        return out
@@ -0,0 +1,21 @@
+import os
+
+# GUNICORN_PRELOAD=1: main diimport sekali di master sehingga model yang sudah
+# dimuat dipakai bersama oleh semua worker (copy-on-write setelah fork)
+preload_app = os.getenv("GUNICORN_PRELOAD", "0") == "1"
+
+
+def post_worker_init(worker):
+    # koneksi storage dibuat per worker, setelah fork
+    import main
+
+    if not main.LAZY_LOAD:
+        main.components.get("store")
+
+
+def worker_exit(server, worker):
+    # flush write-behind buffer prediksi sebelum worker berhenti
+    import main
+
+    if main.components.is_loaded("prediction_writer"):
+        main.components.get("prediction_writer").close()
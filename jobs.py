@@ -0,0 +1,87 @@
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, job_id, user_id):
+        self.id = job_id
+        self.user_id = user_id
+        self.status = "queued"
+        self.rows_scored = 0
+        self.summary = None
+        self.error = None
+        self.created_at = datetime.now().isoformat()
+        self.finished_at = None
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "user_id": self.user_id,
+            "status": self.status,
+            "rows_scored": self.rows_scored,
+            "summary": self.summary,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+# Antrian job lokal dengan jumlah worker dan kapasitas terbatas.
+# Jika kapasitas penuh, submit() menolak job baru (backpressure).
+class JobQueue:
+    def __init__(self, workers=2, max_pending=8, max_finished=1000):
+        self._executor = ThreadPoolExecutor(max_workers=max(1, int(workers)), thread_name_prefix="upload-job")
+        self._slots = threading.BoundedSemaphore(max(1, int(max_pending)))
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self.max_finished = max_finished
+
+    def submit(self, user_id, fn, *args, **kwargs):
+        if not self._slots.acquire(blocking=False):
+            raise QueueFullError("Too many pending upload jobs, try again later.")
+
+        job = Job(uuid.uuid4().hex, user_id)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._evict()
+
+        def progress(rows_scored):
+            job.rows_scored = rows_scored
+
+        def run():
+            job.status = "running"
+            try:
+                job.summary = fn(*args, progress=progress, **kwargs)
+                job.status = "done"
+            except Exception as e:
+                job.error = str(e)
+                job.status = "failed"
+            finally:
+                job.finished_at = datetime.now().isoformat()
+                self._slots.release()
+
+        try:
+            self._executor.submit(run)
+        except Exception:
+            self._slots.release()
+            raise
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _evict(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.status in ("done", "failed")]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self._jobs[job_id]
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,62 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+# Registry komponen berat (import modul, load model, koneksi storage) yang
+# dimuat sekali saat pertama kali dibutuhkan. Waktu load tiap komponen dicatat.
+class Components:
+    def __init__(self):
+        self._loaders = {}
+        self._values = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+        self.timings = {}
+
+    def register(self, name, loader):
+        self._loaders[name] = loader
+        self._locks[name] = threading.Lock()
+
+    def get(self, name):
+        try:
+            return self._values[name]
+        except KeyError:
+            pass
+
+        with self._locks[name]:
+            if name not in self._values:
+                started = time.perf_counter()
+                value = self._loaders[name]()
+                elapsed_ms = (time.perf_counter() - started) * 1000.0
+                with self._lock:
+                    self.timings[name] = round(elapsed_ms, 2)
+                    self._values[name] = value
+                logger.info("Loaded %s in %.1f ms", name, elapsed_ms)
+        return self._values[name]
+
+    def is_loaded(self, name):
+        return name in self._values
+
+    def preload(self, names=None):
+        for name in names or list(self._loaders):
+            self.get(name)
+
+    def status(self):
+        with self._lock:
+            timings = dict(self.timings)
+        return {
+            name: {"loaded": name in timings, "load_ms": timings.get(name)}
+            for name in self._loaders
+        }
+
+
+# Proxy yang meneruskan akses atribut ke objek hasil getter, sehingga kode
+# route tetap memakai `store.xxx` / `model.xxx` tanpa memicu load saat import
+class LazyObject:
+    def __init__(self, getter):
+        object.__setattr__(self, "_getter", getter)
+
+    def __getattr__(self, attr):
+        return getattr(self._getter(), attr)
@@ -1,48 +1,316 @@
-from flask import Flask, json, request, jsonify
-import pandas as pd
-import numpy as np
+import time
+_import_started = time.perf_counter()
+
+from flask import Flask, Response, abort, g, json, request, jsonify, send_from_directory, stream_with_context
 import os
-import joblib
+import atexit
+import hmac
+import importlib
 import io
-import firebase_admin
+import base64
+import shutil
+import tempfile
+import threading
 import re
-from firebase_admin import credentials, firestore, storage
 from datetime import datetime
-from wordcloud import WordCloud
+from batching import MicroBatcher
+from jobs import JobQueue, QueueFullError
+from write_buffer import BufferFullError, WriteBuffer
+from lazy import Components, LazyObject
+from registry import ModelBundle, ModelRegistry, file_version
+from storage import PartialWriteError, create_store, page_predictions
+from metrics import InstrumentedStore, Metrics, SlowRequestProfiler
+from aggregates import chart_summary, informations_summary
+from cache import PredictionCache, ResponseCache, create_shared_cache
+from wordfreq import frequency_fingerprint, merge_frequencies, tokenize
+from collections import Counter
+from contextlib import contextmanager
 
 
-firebase_key = os.getenv("FIREBASE_CREDENTIALS")
-cred = credentials.Certificate(json.loads(firebase_key))
+app = Flask(__name__)
 
-firebase_admin.initialize_app(cred, {
-    'storageBucket': 'staysense-624b4.firebasestorage.app'
-})
+# Timing per route, per stage, dan per panggilan storage; dibaca lewat /metrics
+metrics = Metrics()
+metrics.describe("requests_total", "Requests by route, method and status")
+metrics.describe("request_duration_seconds", "Request latency by route and method")
+metrics.describe("stage_duration_seconds", "Time spent per route stage")
+metrics.describe("storage_call_duration_seconds", "Firestore/Storage call latency by store method")
+metrics.describe("storage_errors_total", "Failed store calls by method")
+metrics.describe("errors_total", "Requests that failed with a 5xx, by route and exception type")
+metrics.describe("upload_parse_seconds_total", "Time spent parsing upload files, by input format")
+metrics.describe("upload_parsed_rows_total", "Rows parsed from upload files, by input format")
+
+# PROFILE_SLOW_MS > 0: request yang lebih lambat dari batas ini ditulis sebagai
+# profile folded stack (flame graph) ke PROFILE_DIR
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", "0"))
+profiler = None
+if PROFILE_SLOW_MS > 0:
+    profiler = SlowRequestProfiler(
+        PROFILE_SLOW_MS,
+        interval_ms=float(os.getenv("PROFILE_INTERVAL_MS", "5")),
+        sample_rate=float(os.getenv("PROFILE_SAMPLE_RATE", "1")),
+        output_dir=os.getenv("PROFILE_DIR", "profiles"),
+    )
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    metrics.set_route(request.url_rule.rule if request.url_rule else "unmatched")
+    if profiler is not None:
+        profiler.start()
+
+@app.after_request
+def record_request_timing(response):
+    started = g.get("request_started")
+    if started is None:
+        return response
+    route = metrics.route
+    method = request.method
+    thread_id = threading.get_ident()
+
+    # dicatat saat response ditutup, sehingga body yang di-stream (/history,
+    # /predict/batch, /user/data) ikut terhitung di durasi dan profil
+    def finish():
+        elapsed = time.perf_counter() - started
+        metrics.observe("request_duration_seconds", elapsed, route=route, method=method)
+        metrics.inc("requests_total", route=route, method=method, status=response.status_code)
+        if profiler is not None:
+            path = profiler.stop(elapsed * 1000.0, f"{method}_{route}", thread_id=thread_id)
+            if path:
+                app.logger.warning("Slow request %s %s (%.0f ms), profile: %s", method, route, elapsed * 1000.0, path)
+
+    response.call_on_close(finish)
+    return response
+
+def record_error(e):
+    # error tetap dikembalikan sebagai JSON 500, tapi dicatat dan di-log dengan traceback
+    metrics.inc("errors_total", route=metrics.route, exception=type(e).__name__)
+    app.logger.exception("Request to %s failed", metrics.route)
 
-# cred = credentials.Certificate("staysenseKey.json")
+def to_snake_case(name):
+    name = re.sub(r"[\s/]+", "_", name)
+    return name.lower()
 
-# firebase_admin.initialize_app(cred, {
-#     'storageBucket': 'staysense-624b4.firebasestorage.app'
-# })
 
-db = firestore.client() 
+def load_scorer(name, model, encoder, columns):
+    if SERVING_PATH != "native" or not hasattr(model, "get_booster"):
+        return model
+
+    from booster import NativeBoosterScorer, max_divergence, reference_matrix
+
+    model_file = NATIVE_MODEL_FILE if name == DEFAULT_MODEL else None
+    scorer = NativeBoosterScorer(model, XGB_NTHREAD, model_file or None)
+    # pastikan hasil booster native sama dengan predict_proba sebelum dipakai
+    reference = reference_matrix(encoder, columns, 1000)
+    divergence = max_divergence(model, scorer, reference)
+    if divergence > NATIVE_MAX_DIVERGENCE:
+        app.logger.warning("Native booster diverges from predict_proba (%.2e), using sklearn path", divergence)
+        return model
+    return scorer
+
+def load_model_bundle(name, model_path):
+    import joblib
+
+    model_bundle = joblib.load(model_path)
+    encoder = {to_snake_case(k): v for k, v in model_bundle["label_encoders"].items()}
+    columns = [to_snake_case(col) for col in model_bundle["columns"]]
+    return ModelBundle(
+        name,
+        file_version(name, model_path),
+        model_bundle["model"],
+        load_scorer(name, model_bundle["model"], encoder, columns),
+        encoder,
+        columns,
+        model_bundle.get("threshold", TRESHOLD),
+    )
+
+def load_model_registry():
+    return ModelRegistry(
+        MODEL_FILES, load_model_bundle, ACTIVE_MODEL,
+        shadow_name=SHADOW_MODEL, shadow_sample_rate=SHADOW_SAMPLE_RATE, scoring_workers=SCORING_WORKERS
+    )
+
+CLUSTERING_MODEL_PATH = os.path.join("model", "kmeans7_model_joblib.pkl")
+
+def load_reason_clusterer():
+    import joblib
+    from clustering import ReasonClusterer
+
+    return ReasonClusterer(joblib.load(CLUSTERING_MODEL_PATH))
+
+
+# Komponen berat dimuat saat pertama kali dibutuhkan (LAZY_LOAD=1) atau
+# langsung saat import (default). Waktu load tiap komponen ada di /startup.
+components = Components()
+components.register("pandas", lambda: importlib.import_module("pandas"))
+components.register("scoring", lambda: importlib.import_module("scoring"))
+components.register("wordcloud", lambda: importlib.import_module("wordcloud"))
+components.register("models", load_model_registry)
+components.register("clustering", load_reason_clusterer)
+# Backend penyimpanan: STORAGE_BACKEND=firestore (default, butuh FIREBASE_CREDENTIALS)
+# atau STORAGE_BACKEND=local (SQLite + folder lokal)
+components.register("store", lambda: InstrumentedStore(create_store(), metrics))
+
+LAZY_LOAD = os.getenv("LAZY_LOAD", "0") == "1"
+# store tidak ikut dipreload agar koneksi Firebase tidak dibuat sebelum fork
+PRELOAD_COMPONENTS = ["pandas", "scoring", "wordcloud", "models", "clustering"]
+
+# Model yang tersedia di registry; bisa ditambah lewat MODEL_REGISTRY='{"nama": "path.pkl"}'
+DEFAULT_MODEL = "xgboost"
+MODEL_FILES = {
+    "xgboost": os.path.join("model", "model_xgboost.pkl"),
+    "tabnet_reall": os.path.join("model", "model_tabnet_reall.pkl"),
+    "tabnet_fix": os.path.join("model", "model_tabnet_fix.pkl"),
+}
+MODEL_FILES.update(json.loads(os.getenv("MODEL_REGISTRY", "{}")))
+ACTIVE_MODEL = os.getenv("ACTIVE_MODEL", DEFAULT_MODEL)
+# Shadow scoring: model kedua dinilai di background untuk sebagian traffic
+SHADOW_MODEL = os.getenv("SHADOW_MODEL", "")
+SHADOW_SAMPLE_RATE = float(os.getenv("SHADOW_SAMPLE_RATE", "0.1"))
+MODEL_ADMIN_TOKEN = os.getenv("MODEL_ADMIN_TOKEN", "")
+# Jumlah thread khusus scoring model (0 = scoring langsung di thread request)
+SCORING_WORKERS = int(os.getenv("SCORING_WORKERS", "0"))
+
+# Jalur scoring: SERVING_PATH=sklearn (default, predict_proba) atau native
+# (Booster.inplace_predict dengan XGB_NTHREAD thread per worker)
+SERVING_PATH = os.getenv("SERVING_PATH", "sklearn")
+XGB_NTHREAD = int(os.getenv("XGB_NTHREAD", "1"))
+NATIVE_MODEL_FILE = os.getenv("NATIVE_MODEL_FILE", "")
+NATIVE_MAX_DIVERGENCE = 1e-5
+
+store = LazyObject(lambda: components.get("store"))
+models = LazyObject(lambda: components.get("models"))
+reason_clusterer = LazyObject(lambda: components.get("clustering"))
 
-app = Flask(__name__)
+TRESHOLD =  0.437
 
-def to_snake_case(name):
-    name = re.sub(r"[\s/]+", "_", name)
-    return name.lower()
+# Micro-batching untuk /predict (aktifkan dengan PREDICT_BATCHING=1)
+PREDICT_BATCHING = os.getenv("PREDICT_BATCHING", "0") == "1"
+PREDICT_BATCH_MAX_SIZE = int(os.getenv("PREDICT_BATCH_MAX_SIZE", "32"))
+PREDICT_BATCH_MAX_WAIT_MS = float(os.getenv("PREDICT_BATCH_MAX_WAIT_MS", "5"))
+
+# /predict/batch: record di-encode dan diprediksi per chunk, jumlah record per request dibatasi
+PREDICT_BATCH_CHUNK_SIZE = int(os.getenv("PREDICT_BATCH_CHUNK_SIZE", "1000"))
+PREDICT_BATCH_MAX_RECORDS = int(os.getenv("PREDICT_BATCH_MAX_RECORDS", "10000"))
+
+# satu batcher per bundle agar baris tidak dinilai model yang berbeda dari encodernya
+batchers = {}
+batchers_lock = threading.Lock()
+
+def get_batcher(bundle):
+    # None untuk request yang masih memegang bundle lama setelah model diganti
+    with batchers_lock:
+        batcher = batchers.get(bundle.version)
+        if batcher is None and bundle.version == models.active.version:
+            # model diganti: batcher versi lama dihentikan (thread worker-nya selesai)
+            for old in batchers.values():
+                old.close()
+            batchers.clear()
+            batcher = MicroBatcher(models.timed_scorer(bundle), PREDICT_BATCH_MAX_SIZE, PREDICT_BATCH_MAX_WAIT_MS)
+            batchers[bundle.version] = batcher
+        return batcher
+
+# Cache probabilitas per vektor fitur untuk /predict (PREDICTION_CACHE_SIZE=0 untuk mematikan),
+# dikosongkan otomatis saat model aktif berganti. UPLOAD_DEDUPE=1: baris duplikat
+# di satu chunk /upload hanya diprediksi sekali.
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", "0"))
+UPLOAD_DEDUPE = os.getenv("UPLOAD_DEDUPE", "0") == "1"
+
+prediction_cache = PredictionCache(PREDICTION_CACHE_SIZE)
+
+# Scoring paralel (process pool) untuk upload CSV besar, UPLOAD_PARALLEL_WORKERS=0 untuk mematikan
+UPLOAD_PARALLEL_WORKERS = int(os.getenv("UPLOAD_PARALLEL_WORKERS", "0"))
+UPLOAD_PARALLEL_MIN_BYTES = int(os.getenv("UPLOAD_PARALLEL_MIN_BYTES", str(32 << 20)))
+UPLOAD_PARALLEL_RANGE_BYTES = int(os.getenv("UPLOAD_PARALLEL_RANGE_BYTES", str(64 << 20)))
+
+# satu process pool per versi bundle; pool lama di-retire saat model diganti dan
+# baru dimatikan setelah upload yang masih memakainya selesai
+parallel_scorers = {}
+parallel_scorers_lock = threading.Lock()
+
+def new_parallel_scorer(bundle):
+    from parallel import ParallelScorer
+
+    return ParallelScorer(
+        models.paths[bundle.name],
+        bundle.scorer is not bundle.model,
+        bundle.threshold,
+        CLUSTERING_MODEL_PATH,
+        UPLOAD_PARALLEL_WORKERS,
+        dedupe=UPLOAD_DEDUPE,
+        chunksize=UPLOAD_CHUNK_SIZE,
+        csv_engine=UPLOAD_CSV_ENGINE,
+        range_bytes=UPLOAD_PARALLEL_RANGE_BYTES,
+    )
+
+@contextmanager
+def parallel_scorer(bundle):
+    with parallel_scorers_lock:
+        scorer = parallel_scorers.get(bundle.version)
+        if scorer is None and bundle.version == models.active.version:
+            for old in parallel_scorers.values():
+                old.retire()
+            parallel_scorers.clear()
+            scorer = new_parallel_scorer(bundle)
+            parallel_scorers[bundle.version] = scorer
+        if scorer is not None:
+            scorer.acquire()
+    if scorer is None:
+        # upload yang masih memegang bundle lama setelah model diganti: pool sendiri yang
+        # ditutup setelah selesai, pool versi aktif tidak disentuh
+        scorer = new_parallel_scorer(bundle)
+        scorer.acquire()
+        scorer.retire()
+    try:
+        yield scorer
+    finally:
+        scorer.release()
+
+# Ukuran chunk (baris) untuk scoring /upload
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", "50000"))
+# Parser CSV: pyarrow (multithread, default) atau pandas
+UPLOAD_CSV_ENGINE = os.getenv("UPLOAD_CSV_ENGINE", "pyarrow")
+
+# Artifact hasil scoring /upload: format default (parquet|arrow|csv) dan kolom
+# identitas customer dari file input yang ikut disimpan
+UPLOAD_RESULTS_FORMAT = os.getenv("UPLOAD_RESULTS_FORMAT", "parquet")
+UPLOAD_ID_COLUMNS = [col.strip().lower() for col in os.getenv("UPLOAD_ID_COLUMNS", "customer_id").split(",") if col.strip()]
+RESULTS_DEFAULT_PAGE_SIZE = 100
+RESULTS_MAX_PAGE_SIZE = 1000
+
+# Jumlah kata maksimum yang disimpan di frekuensi wordcloud per user
+WORDCLOUD_VOCAB_SIZE = int(os.getenv("WORDCLOUD_VOCAB_SIZE", "2000"))
+
+# Mode kualitas render wordcloud; "preview" lebih kecil dan lebih cepat
+WORDCLOUD_RENDER_MODES = {
+    "full": {"width": 800, "height": 400, "max_words": 200, "font_step": 1, "suffix": ""},
+    "preview": {"width": 400, "height": 200, "max_words": 50, "font_step": 2, "suffix": "_preview"},
+}
+WORDCLOUD_QUALITY = os.getenv("WORDCLOUD_QUALITY", "full")
 
+_wordcloud_local = threading.local()
 
-# model_path = os.path.join("model", "model_tabnet_reall.pkl")
-model_path = os.path.join("model", "model_xgboost.pkl")
-model_bundle = joblib.load(model_path)
-model = model_bundle["model"]
-encoder = {to_snake_case(k): v for k, v in model_bundle["label_encoders"].items()}
-columns = [to_snake_case(col) for col in model_bundle["columns"]]
+# Cache response dashboard per user (RESPONSE_CACHE_SIZE=0 untuk mematikan)
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "1024"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "60"))
 
-bucket = storage.bucket()
+response_cache = ResponseCache(
+    RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL, shared=create_shared_cache(os.getenv("RESPONSE_CACHE_SHARED"))
+)
 
-TRESHOLD =  0.437
+# Penulisan prediksi: sync (langsung per request) atau buffered (write-behind,
+# ditulis per batch saat WRITE_BUFFER_MAX_BATCH record atau WRITE_BUFFER_FLUSH_MS tercapai)
+PREDICTION_WRITE_MODE = os.getenv("PREDICTION_WRITE_MODE", "sync")
+WRITE_BUFFER_MAX_BATCH = int(os.getenv("WRITE_BUFFER_MAX_BATCH", "400"))
+WRITE_BUFFER_FLUSH_MS = float(os.getenv("WRITE_BUFFER_FLUSH_MS", "200"))
+WRITE_BUFFER_MAX_PENDING = int(os.getenv("WRITE_BUFFER_MAX_PENDING", "10000"))
+WRITE_BUFFER_BLOCK_TIMEOUT = float(os.getenv("WRITE_BUFFER_BLOCK_TIMEOUT", "5"))
+
+# Worker pool untuk /upload mode async
+UPLOAD_JOB_WORKERS = int(os.getenv("UPLOAD_JOB_WORKERS", "2"))
+UPLOAD_JOB_QUEUE_SIZE = int(os.getenv("UPLOAD_JOB_QUEUE_SIZE", "8"))
+
+upload_jobs = JobQueue(UPLOAD_JOB_WORKERS, UPLOAD_JOB_QUEUE_SIZE)
 
 
 # Kolom yang dibutuhkan
@@ -54,50 +322,108 @@ required_cols = [
     "total_charges", "total_revenue", "satisfaction_score", "churn_score", "cltv"
 ]
 
-def encode_input(data_dict):
-    processed = {}
-    for col in columns:
-        val = data_dict.get(col)
-        if val is None:
-            raise ValueError(f"Missing required input: '{col}'")
-        
-        if col in encoder:
-            le = encoder[col]
-            if val not in le.classes_:
-                raise ValueError(
-                    f"Invalid value '{val}' for column '{col}'. Expected one of: {list(le.classes_)}"
-                )
-            val = le.transform([val])[0]
-        else:
-            if isinstance(val, str) and val.strip().lower() in ['yes', 'no']:
-                val = 1 if val.strip().lower() == 'yes' else 0
-            elif isinstance(val, str):
-                try:
-                    val = float(val)
-                except ValueError:
-                    raise ValueError(f"Invalid non-numeric input after encoding: {val}")
-        
-        processed[col] = val
-
-    return np.array([list(processed.values())], dtype=np.float32)
+def invalidate_users(records):
+    # data dashboard user ini berubah, hapus cache-nya
+    for user_id in {record.get("user_id") for record in records}:
+        response_cache.invalidate_user(user_id)
+
+def create_prediction_writer():
+    writer = WriteBuffer(
+        store.add_predictions,
+        max_batch=WRITE_BUFFER_MAX_BATCH,
+        flush_interval_ms=WRITE_BUFFER_FLUSH_MS,
+        max_pending=WRITE_BUFFER_MAX_PENDING,
+        block_timeout=WRITE_BUFFER_BLOCK_TIMEOUT,
+        on_flushed=invalidate_users,
+    )
+    # sisa buffer di-flush saat proses berhenti
+    atexit.register(writer.close)
+    return writer
+
+components.register("prediction_writer", create_prediction_writer)
+
+def save_prediction(record):
+    if PREDICTION_WRITE_MODE == "buffered":
+        components.get("prediction_writer").add(record)
+        return
+    store.add_prediction(record)
+    invalidate_users([record])
+
+def cached_response(endpoint, user_id, build):
+    value, generation = response_cache.get(endpoint, user_id)
+    if value is None:
+        value = build()
+        response_cache.set(endpoint, user_id, value, generation)
+    return value
+
+
+def encode_input(data_dict, bundle=None):
+    bundle = bundle or models.active
+    return bundle.feature_encoder.encode_row(data_dict)
+
+def predict_churn_probability(bundle, input_data):
+    batcher = get_batcher(bundle) if PREDICT_BATCHING else None
+    if batcher is not None:
+        return batcher.predict(input_data)
+    return models.score(bundle, input_data)[0][1]
+
+def cached_churn_probability(bundle, input_data):
+    # cache hanya dipakai untuk versi aktif, agar request dengan bundle lama tidak mengosongkannya
+    if not prediction_cache.enabled or bundle.version != models.active.version:
+        return predict_churn_probability(bundle, input_data)
+    key = prediction_cache.key(input_data)
+    churn_probability = prediction_cache.get(bundle.version, key)
+    if churn_probability is None:
+        churn_probability = float(predict_churn_probability(bundle, input_data))
+        prediction_cache.set(bundle.version, key, churn_probability)
+    return churn_probability
+
+
+def prediction_result(churn_probability, threshold):
+    if churn_probability > threshold:
+        return {
+            "is_churn": True,
+            "churn_rate": f"{round(churn_probability * 100, 2):.2f}%",
+            "message": "The model predicts that this customer is likely to CHURN.",
+            "solution": "It is recommended to take proactive actions such as offering promotions, personalized support, or loyalty programs to retain the customer."
+        }
+    return {
+        "is_churn": False,
+        "not_churn_rate": f"{round((1 - churn_probability) * 100, 2):.2f}%",
+        "message": "The model predicts that this customer is likely to STAY.",
+        "solution": "Continue providing consistent service quality and consider rewarding loyalty to maintain customer satisfaction."
+    }
 
 
 @app.route("/", methods=["GET"])
 def index():
     return "API is running!"
 
+def precomputed_response(payload):
+    # body dan ETag sudah jadi; conditional GET cukup membandingkan ETag
+    use_gzip = request.accept_encodings["gzip"] > 0
+    etag = f"{payload.etag}-gzip" if use_gzip else payload.etag
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(payload.gzip_body if use_gzip else payload.body, mimetype="application/json")
+        if use_gzip:
+            response.headers["Content-Encoding"] = "gzip"
+    response.set_etag(etag)
+    response.vary.add("Accept-Encoding")
+    response.cache_control.no_cache = True
+    return response
+
 @app.route("/valid-values", methods=["GET"])
 def valid_values():
-    return jsonify({
-        col: list(encoder[col].classes_)
-        for col in encoder
-    })
+    return precomputed_response(models.active.valid_values_json)
 
 # Input Manual
 @app.route("/predict", methods=["POST"])
 def predict():
     try:
-        data = request.get_json()
+        with metrics.stage("parse_json"):
+            data = request.get_json()
         user_id = data.get("id")
         
         if not user_id:
@@ -105,46 +431,43 @@ def predict():
         
         data = {k.lower(): v for k, v in data.items()}
         
-        input_data = encode_input(data)
+        # bundle diambil sekali agar tetap konsisten walau model aktif diganti
+        bundle = models.active
+        with metrics.stage("encode_input"):
+            input_data = encode_input(data, bundle)
 
-        churn_probability = model.predict_proba(input_data)[0][1]
+        with metrics.stage("predict_proba"):
+            churn_probability = cached_churn_probability(bundle, input_data)
+        models.shadow(data, bundle, churn_probability)
 
         # output yang keluar
-        if churn_probability > TRESHOLD:
-            result = {
-                "is_churn": True,                
-                "churn_rate": f"{round(churn_probability * 100, 2):.2f}%",
-                "message": "The model predicts that this customer is likely to CHURN.",
-                "solution": "It is recommended to take proactive actions such as offering promotions, personalized support, or loyalty programs to retain the customer."
-                }
-        else:
-            result = {
-                "is_churn": False,
-                "not_churn_rate": f"{round((1 - churn_probability) * 100, 2):.2f}%",
-                "message": "The model predicts that this customer is likely to STAY.",
-                "solution": "Continue providing consistent service quality and consider rewarding loyalty to maintain customer satisfaction."        
-            }
+        result = prediction_result(churn_probability, bundle.threshold)
 
         now = datetime.now()
         month_str = now.strftime("%Y-%m")
 
         # output masuk ke firestore
-        db.collection("predictions").add({
-            "user_id": user_id,
-            "input_source":"manual",
-            "timestamp": now.isoformat(),
-            "month": month_str,
-            "is_churn": result["is_churn"],
-            "rate": float(churn_probability),
-            "customer_data": data 
-        })
+        with metrics.stage("save_prediction"):
+            save_prediction({
+                "user_id": user_id,
+                "input_source":"manual",
+                "timestamp": now.isoformat(),
+                "month": month_str,
+                "is_churn": result["is_churn"],
+                "rate": float(churn_probability),
+                "customer_data": data 
+            })
         
         return jsonify({
             "status": "success",
             "prediction": result
         })
 
+    except BufferFullError as e:
+        return jsonify({"status": "error", "message": str(e)}), 503
+
     except Exception as e:
+        record_error(e)
         return jsonify({
             "status": "error",
             "message": f"Missing input data : {str(e)}",
@@ -155,13 +478,272 @@ def predict():
             }
         }), 500
             
+def read_batch_records():
+    # JSON array (dibaca sekaligus) atau NDJSON (dibaca per baris dari stream request)
+    if "ndjson" in (request.mimetype or "") or "jsonl" in (request.mimetype or ""):
+        def ndjson_records():
+            for line in request.stream:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError as e:
+                    yield ValueError(f"Invalid JSON: {e}")
+        return ndjson_records()
+
+    records = request.get_json(silent=True)
+    if not isinstance(records, list):
+        raise ValueError("Body must be a JSON array or NDJSON (Content-Type: application/x-ndjson) of customer records")
+    return records
+
+def score_batch(bundle, user_id, batch, first_index, timestamp):
+    # batch: list record mentah; hasil per record dalam urutan input + record untuk disimpan
+    results = [None] * len(batch)
+    rows = []
+    for i, data in enumerate(batch):
+        if isinstance(data, Exception):
+            results[i] = {"index": first_index + i, "status": "error", "message": str(data)}
+            continue
+        if not isinstance(data, dict):
+            results[i] = {"index": first_index + i, "status": "error", "message": "Record must be a JSON object"}
+            continue
+        data = {k.lower(): v for k, v in data.items()}
+        if not (data.get("id") or user_id):
+            results[i] = {"index": first_index + i, "status": "error", "message": "user_id is required"}
+            continue
+        rows.append((i, data))
+
+    with metrics.stage("encode_input"):
+        input_data, valid, errors = bundle.feature_encoder.encode_rows([data for _, data in rows])
+    for j, message in errors.items():
+        i = rows[j][0]
+        results[i] = {"index": first_index + i, "status": "error", "message": message}
+
+    records = []
+    if valid:
+        with metrics.stage("predict_proba"):
+            proba = models.score(bundle, input_data)[:, 1]
+        for j, churn_probability in zip(valid, proba.tolist()):
+            i, data = rows[j]
+            result = prediction_result(churn_probability, bundle.threshold)
+            results[i] = {"index": first_index + i, "status": "success", "prediction": result}
+            records.append({
+                "user_id": data.get("id") or user_id,
+                "input_source": "batch",
+                "timestamp": timestamp.isoformat(),
+                "month": timestamp.strftime("%Y-%m"),
+                "is_churn": result["is_churn"],
+                "rate": churn_probability,
+                "customer_data": data
+            })
+    return results, records
+
+def stream_batch_predictions(bundle, user_id, records_iter):
+    now = datetime.now()
+    summary = {"total": 0, "success": 0, "failed": 0, "saved": 0}
+    to_save = []
+    to_save_index = []
+    batch = []
+
+    def flush(batch):
+        results, records = score_batch(bundle, user_id, batch, summary["total"], now)
+        summary["total"] += len(batch)
+        summary["success"] += len(records)
+        summary["failed"] += len(batch) - len(records)
+        to_save.extend(records)
+        to_save_index.extend(result["index"] for result in results if result["status"] == "success")
+        return "".join(json.dumps(result) + "\n" for result in results)
+
+    for data in records_iter:
+        if summary["total"] + len(batch) >= PREDICT_BATCH_MAX_RECORDS:
+            summary["truncated"] = True
+            break
+        batch.append(data)
+        if len(batch) >= PREDICT_BATCH_CHUNK_SIZE:
+            yield flush(batch)
+            batch = []
+    if batch:
+        yield flush(batch)
+
+    # semua prediksi dari satu request disimpan sekaligus
+    error = None
+    if to_save:
+        try:
+            with metrics.stage("save_prediction"):
+                store.add_predictions(to_save)
+            invalidate_users(to_save)
+            summary["saved"] = len(to_save)
+        except PartialWriteError as e:
+            # commit pertama sudah tersimpan (termasuk agregatnya), sisanya tidak
+            record_error(e)
+            invalidate_users(to_save[:e.saved])
+            summary["saved"] = e.saved
+            summary["partial"] = True
+            summary["unsaved_from_index"] = to_save_index[e.saved]
+            error = f"Failed to save predictions: {e.cause}"
+        except Exception as e:
+            record_error(e)
+            error = f"Failed to save predictions: {e}"
+    yield json.dumps({"summary": summary, "error": error} if error else {"summary": summary}) + "\n"
+
+@app.route("/predict/batch", methods=["POST"])
+def predict_batch():
+    try:
+        records = read_batch_records()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # bundle diambil sekali agar satu batch dinilai dengan model yang sama
+    bundle = models.active
+    return Response(
+        stream_with_context(stream_batch_predictions(bundle, request.args.get("id"), records)),
+        mimetype="application/x-ndjson",
+    )
+
+@app.route("/predict/cache", methods=["GET"])
+def predict_cache_stats():
+    return jsonify({"enabled": prediction_cache.enabled, "upload_dedupe": UPLOAD_DEDUPE, **prediction_cache.stats()})
+
+@app.route("/predict/batching", methods=["GET"])
+def predict_batching_stats():
+    if not PREDICT_BATCHING:
+        return jsonify({"enabled": False})
+    return jsonify({"enabled": True, **get_batcher(models.active).stats()})
+
 # Upload File
 def upload_to_storage(user_id, file, filename, folder="uploaded_files"):
     # user_folder = f"{folder}/{user_id}/"
-    blob = bucket.blob(f"{folder}/{user_id}/{filename}")
-    blob.upload_from_file(file, content_type=file.content_type)
-    blob.make_public()
-    return blob.public_url
+    return store.upload_file(f"{folder}/{user_id}/{filename}", file, content_type=file.content_type)
+
+def use_parallel_scoring(file, filename, results_format):
+    # hanya CSV besar tanpa artifact hasil per baris; shadow scoring tidak dijalankan di mode ini
+    if UPLOAD_PARALLEL_WORKERS < 2 or results_format or not filename.endswith(".csv"):
+        return False
+    file.seek(0, os.SEEK_END)
+    size = file.tell()
+    file.seek(0)
+    return size >= UPLOAD_PARALLEL_MIN_BYTES
+
+def score_upload_in_parallel(file, bundle, progress=None):
+    # worker membaca file dari disk; upload sync di-spool dulu ke file sementara
+    path = getattr(file, "name", None)
+    tmp_path = None
+    if not isinstance(path, str) or not os.path.isfile(path):
+        with tempfile.NamedTemporaryFile(suffix=".csv", delete=False) as tmp:
+            shutil.copyfileobj(file, tmp)
+            tmp_path = path = tmp.name
+    try:
+        with parallel_scorer(bundle) as scorer:
+            return scorer.score_csv(path, REASON_COLUMN, progress)
+    finally:
+        if tmp_path:
+            os.remove(tmp_path)
+
+def process_upload(user_id, file, filename, content_type=None, results_format=None, progress=None):
+    reason_counts = Counter()
+    bundle = models.active
+    timed_scorer = models.timed_scorer(bundle)
+
+    def predict_proba(input_data):
+        with metrics.stage("predict_proba"):
+            if UPLOAD_DEDUPE:
+                proba, unique_rows = scoring.predict_unique(timed_scorer.predict_proba, input_data)
+                prediction_cache.record_dedupe(len(input_data), unique_rows)
+                return proba
+            return timed_scorer.predict_proba(input_data)
+
+    def on_chunk(chunk, proba):
+        if REASON_COLUMN in chunk.columns:
+            reason_counts.update(reason_clusterer.count_clusters(chunk[REASON_COLUMN]))
+        models.shadow(chunk, bundle, proba)
+
+    # Baca dan prediksi per chunk agar memori tetap rata untuk file besar
+    scoring = components.get("scoring")
+    wanted = bundle.columns + [REASON_COLUMN] + UPLOAD_ID_COLUMNS
+    input_format = scoring.input_format(filename)
+    parse_timing = {}
+    chunks = metrics.timed_iter(
+        "parse",
+        scoring.iter_chunks(
+            file, filename, UPLOAD_CHUNK_SIZE, wanted=wanted,
+            dtypes=bundle.feature_encoder.dtypes, csv_engine=UPLOAD_CSV_ENGINE,
+        ),
+        on_done=lambda elapsed: parse_timing.update(seconds=elapsed),
+    )
+    results_name = None
+    if use_parallel_scoring(file, filename, results_format):
+        with metrics.stage("parallel_score"):
+            total_customers, churn_count, unique_rows, counts = score_upload_in_parallel(file, bundle, progress)
+        reason_counts.update(counts)
+        if UPLOAD_DEDUPE:
+            prediction_cache.record_dedupe(total_customers, unique_rows)
+    elif results_format:
+        # hasil per baris ditulis langsung ke folder user di Storage selama chunk diproses
+        results_name = f"{os.path.splitext(filename)[0]}_predictions{scoring.RESULTS_FORMATS[results_format]}"
+        results_path = f"{user_id}/{results_name}"
+        try:
+            with store.blob_writer(results_path, scoring.RESULTS_CONTENT_TYPES[results_format]) as results_file:
+                results_writer = scoring.ResultsWriter(results_file, results_format)
+                total_customers, churn_count = scoring.score_chunks(
+                    chunks, bundle.feature_encoder, predict_proba, bundle.threshold,
+                    results_writer, progress, on_chunk, UPLOAD_ID_COLUMNS
+                )
+                results_writer.close()
+        except Exception:
+            # artifact setengah jadi tidak disimpan
+            try:
+                store.delete_blob(results_path)
+            except Exception:
+                pass
+            raise
+    else:
+        total_customers, churn_count = scoring.score_chunks(
+            chunks, bundle.feature_encoder, predict_proba, bundle.threshold, progress=progress, on_chunk=on_chunk
+        )
+
+    if "seconds" in parse_timing:
+        # waktu parse per format (detik per juta baris = seconds_total / rows_total * 1e6)
+        metrics.inc("upload_parse_seconds_total", parse_timing["seconds"], format=input_format)
+        metrics.inc("upload_parsed_rows_total", total_customers, format=input_format)
+
+    # Upload file ke Firebase Storage dengan user_id
+    file.seek(0)
+    with metrics.stage("storage_upload"):
+        file_url = upload_to_storage(file, filename, user_id, content_type=content_type)
+
+    # Simpan summary hasil prediksi ke Firestore
+    summary = {
+        "user_id": user_id, 
+        "input_source": "Upload file",
+        "total_customers": total_customers,
+        "churn_count": churn_count,
+        "not_churn_count": total_customers - churn_count,
+        "churn_rate": f"{(churn_count / total_customers) * 100:.2f}%",
+        "filename": filename,
+        "file_url": file_url,
+        "timestamp": datetime.now().isoformat(),
+        "month": datetime.now().strftime("%Y-%m")
+    }
+
+    if results_name:
+        summary["predictions_file"] = results_name
+        summary["predictions_url"] = store.blob_url(results_path)
+
+    with metrics.stage("save_prediction"):
+        save_prediction(summary)
+    record_reason_clusters(user_id, reason_counts)
+    return summary
+
+
+def run_upload_job(user_id, path, filename, content_type, results_format, progress=None):
+    metrics.set_route("/upload")
+    try:
+        with open(path, "rb") as file:
+            return process_upload(user_id, file, filename, content_type, results_format, progress)
+    finally:
+        os.remove(path)
+
 
 @app.route("/upload", methods=["POST"])
 def upload():
@@ -177,58 +759,45 @@ def upload():
         file = request.files['file']
         filename = file.filename.lower()
 
-        if filename.endswith(".csv"):
-            df = pd.read_csv(file)
-        elif filename.endswith((".xls", ".xlsx")):
-            df = pd.read_excel(file)
-        else:
-            return jsonify({"error": "Unsupported file format. Only CSV, XLS, XLSX allowed."}), 400
-
-        df.columns = df.columns.str.lower().str.replace(' ', '_').str.replace('[^a-zA-Z0-9_]', '', regex=True)
-
-        missing_cols = [col for col in columns if col not in df.columns]
-        if missing_cols:
-            return jsonify({"error": f"Missing columns: {missing_cols}"}), 400
-
-        df = df[columns]
-
-        # Encode data
-        for col in df.columns:
-            if col in encoder:
-                le = encoder[col]
-                if not df[col].isin(le.classes_).all():
-                    unknown_vals = df[~df[col].isin(le.classes_)][col].unique().tolist()
-                    return jsonify({
-                        "error": f"Invalid values in column '{col}': {unknown_vals}. Expected one of: {list(le.classes_)}"
-                    }), 400
-                df[col] = le.transform(df[col])
-
-        input_data = df.to_numpy()
-        proba = model.predict_proba(input_data)
-        churn_flags = proba[:, 1] > TRESHOLD
-
-        total_customers = len(proba)
-        churn_count = int(np.sum(churn_flags))
-
-        # Upload file ke Firebase Storage dengan user_id
-        file.stream.seek(0)
-        file_url = upload_to_storage(file, filename, user_id) 
-
-        # Simpan summary hasil prediksi ke Firestore
-        summary = {
-            "user_id": user_id, 
-            "input_source": "Upload file",
-            "total_customers": total_customers,
-            "churn_count": churn_count,
-            "not_churn_count": total_customers - churn_count,
-            "churn_rate": f"{(churn_count / total_customers) * 100:.2f}%",
-            "filename": filename,
-            "file_url": file_url,
-            "timestamp": datetime.now().isoformat(),
-            "month": datetime.now().strftime("%Y-%m")
-        }
-        
-        db.collection("predictions").add(summary)
+        scoring = components.get("scoring")
+        if scoring.input_format(filename) is None:
+            return jsonify({"error": scoring.UNSUPPORTED_FORMAT_MESSAGE}), 400
+
+        results_format = None
+        if request.form.get("save_predictions", "").lower() in ("1", "true", "yes"):
+            results_format = request.form.get("results_format", UPLOAD_RESULTS_FORMAT).lower()
+            if results_format not in ("parquet", "arrow", "csv"):
+                return jsonify({"error": "Unsupported results_format. Only parquet, arrow, csv allowed."}), 400
+
+        # Mode async: file disimpan sementara lalu diproses oleh worker pool
+        if request.form.get("async", "").lower() in ("1", "true", "yes"):
+            tmp = tempfile.NamedTemporaryFile(suffix=os.path.splitext(filename)[1], delete=False)
+            path = tmp.name
+            submitted = False
+            try:
+                with tmp:
+                    file.save(tmp)
+                job = upload_jobs.submit(
+                    user_id, run_upload_job, user_id, path, filename, file.content_type, results_format
+                )
+                submitted = True
+            except QueueFullError as e:
+                return jsonify({"status": "error", "message": str(e)}), 429
+            finally:
+                # file sementara dihapus oleh job; jika job tidak jadi dibuat, dihapus di sini
+                if not submitted:
+                    os.remove(path)
+
+            return jsonify({"status": "queued", "job_id": job.id}), 202
+
+        try:
+            summary = process_upload(user_id, file.stream, filename, file.content_type, results_format)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        except BufferFullError as e:
+            # file upload (dan artifact hasil) sudah di storage dan dibiarkan; upload ulang
+            # dengan nama file yang sama menimpa path yang sama
+            return jsonify({"status": "error", "message": str(e)}), 503
 
         return jsonify({
             "status": "success",
@@ -236,36 +805,148 @@ def upload():
         })
 
     except Exception as e:
+        record_error(e)
         return jsonify({
             "status": "error",
             "message": str(e)
         }), 500
 
-from collections import defaultdict
-@app.route("/history", methods=["GET"])
-def get_summary_history():
+@app.route("/upload/jobs/<job_id>", methods=["GET"])
+def get_upload_job(job_id):
+    job = upload_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job.to_dict())
+
+@app.route("/upload/results", methods=["GET"])
+def get_upload_results():
+    # Baca sebagian baris artifact hasil upload (row range + kolom tertentu)
+    user_id = request.args.get("id")
+    results_name = request.args.get("file", "")
+    if not user_id:
+        return jsonify({"error": "user_id is required"}), 400
+
+    scoring = components.get("scoring")
+    results_format = scoring.results_format(results_name)
+    if "/" in results_name or results_format not in ("parquet", "arrow"):
+        return jsonify({"error": "file must be a .parquet or .arrow results file"}), 400
+
     try:
-        docs = db.collection("predictions").order_by("timestamp", direction=firestore.Query.DESCENDING).stream()
-        
-        # Dictionary untuk menyimpan data per bulan
-        history_per_month = defaultdict(list)
+        offset = int(request.args.get("offset", 0))
+        limit = int(request.args.get("limit", RESULTS_DEFAULT_PAGE_SIZE))
+    except ValueError:
+        return jsonify({"error": "offset and limit must be integers"}), 400
+    if offset < 0 or not 1 <= limit <= RESULTS_MAX_PAGE_SIZE:
+        return jsonify({"error": f"offset must be >= 0 and limit between 1 and {RESULTS_MAX_PAGE_SIZE}"}), 400
+    columns = [col.strip() for col in request.args.get("columns", "").split(",") if col.strip()] or None
 
-        for doc in docs:
-            data = doc.to_dict()
-            timestamp = data.get("timestamp")
-            month = data.get("month", "")  # Jika data sudah ada field month yang berisi bulan dalam format "YYYY-MM"
+    try:
+        with store.open_blob(f"{user_id}/{results_name}") as results_file:
+            rows = scoring.read_results_range(results_file, results_format, offset, limit, columns)
+    except FileNotFoundError:
+        return jsonify({"error": "Results file not found"}), 404
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
 
-            # Ambil bulan dari timestamp jika tidak ada field "month"
-            if not month and timestamp:
-                month = datetime.strptime(timestamp, "%Y-%m-%dT%H:%M:%S.%f%z").strftime("%Y-%m")
+    return jsonify({"offset": offset, "limit": limit, "count": len(rows), "rows": rows})
 
-            if month:
-                history_per_month[month].append(data)
+HISTORY_SUMMARY_FIELDS = [
+    "user_id", "input_source", "timestamp", "month", "is_churn", "rate",
+    "total_customers", "churn_count", "not_churn_count", "churn_rate", "filename", "file_url",
+    "predictions_file", "predictions_url"
+]
+HISTORY_DEFAULT_PAGE_SIZE = 50
+HISTORY_MAX_PAGE_SIZE = 500
 
-        # Convert dictionary to list of dictionaries for output
-        grouped_history = [{"month": month, "data": history} for month, history in history_per_month.items()]
+def encode_cursor(timestamp, key=None):
+    # key: id dokumen terakhir, pembeda dokumen dengan timestamp yang sama (mis. hasil /predict/batch)
+    payload = {"ts": timestamp} if key is None else {"ts": timestamp, "key": key}
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
 
-        return jsonify({"history_per_month": grouped_history})
+def decode_cursor(cursor):
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return payload["ts"], payload.get("key")
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def stream_history(docs, limit):
+    # data sudah urut timestamp DESC sehingga tiap bulan berurutan,
+    # grup bulan bisa ditulis langsung tanpa menampung semua data.
+    # docs berisi (key, data); cursor = timestamp + key dokumen terakhir, seperti /user/data.
+    yield '{"history_per_month": ['
+    current_month = None
+    last = None
+    count = 0
+    for key, data in docs:
+        count += 1
+        timestamp = data.get("timestamp")
+        last = (timestamp, key) if timestamp else None
+        month = data.get("month", "")  # Jika data sudah ada field month yang berisi bulan dalam format "YYYY-MM"
+
+        # Ambil bulan dari timestamp jika tidak ada field "month"
+        if not month and timestamp:
+            month = timestamp[:7]
+
+        if not month:
+            continue
+
+        if month != current_month:
+            if current_month is not None:
+                yield ']},'
+            yield f'{{"month": {json.dumps(month)}, "data": ['
+            current_month = month
+        else:
+            yield ','
+        yield json.dumps(data)
+
+    if current_month is not None:
+        yield ']}'
+    next_cursor = encode_cursor(*last) if count == limit and last else None
+    yield f'], "next_cursor": {json.dumps(next_cursor)}}}'
+
+@app.route("/history", methods=["GET"])
+def get_summary_history():
+    try:
+        user_id = request.args.get("id")
+        month_from = request.args.get("from")
+        month_to = request.args.get("to")
+        details = request.args.get("details", "").lower() in ("1", "true", "yes")
+
+        try:
+            limit = min(int(request.args.get("limit", HISTORY_DEFAULT_PAGE_SIZE)), HISTORY_MAX_PAGE_SIZE)
+            if limit < 1:
+                raise ValueError
+        except ValueError:
+            return jsonify({"error": f"limit must be an integer between 1 and {HISTORY_MAX_PAGE_SIZE}"}), 400
+
+        for value in (month_from, month_to):
+            if value and not re.fullmatch(r"\d{4}-\d{2}", value):
+                return jsonify({"error": "from/to must use the YYYY-MM format"}), 400
+
+        cursor = request.args.get("cursor")
+        start_after, after_key = None, None
+        try:
+            if cursor:
+                start_after, after_key = decode_cursor(cursor)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        # cursor lama (tanpa key) melanjutkan setelah timestamp-nya
+        docs = store.query_predictions(
+            user_id=user_id,
+            month_from=month_from,
+            month_to=month_to,
+            start_after=start_after,
+            after_key=after_key,
+            limit=limit,
+            fields=None if details else HISTORY_SUMMARY_FIELDS,
+            with_keys=True,
+        )
+
+        return Response(stream_with_context(stream_history(docs, limit)), mimetype="application/json")
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -274,75 +955,15 @@ def get_summary_history():
 @app.route("/dashboard/chart", methods=["GET"])
 def get_chart_data():
     try:
-        # docs = db.collection("predictions").stream()
         user_id = request.args.get("id")
         
         if not user_id:
             return jsonify({"error": "user_id is required"}), 400
         
-        docs = db.collection("predictions").where("user_id", "==", user_id).stream()
-        
-        total_churn = 0
-        total_not_churn = 0
-        total_customers = 0
-        churn_data_per_month = {}
-        total_customers_per_month = {}
-        
-        for doc in docs:
-            data = doc.to_dict()
-            is_churn = data.get("is_churn", None)
-            month = data.get("month", "")
-            customers = data.get("total_customers", 1)
-            churn_count = data.get("churn_count", 0)
-            
-            total_customers += customers
-            
-            # update customer
-            if is_churn is not None:
-                if is_churn:
-                    total_churn += customers  
-                else:
-                    total_not_churn += customers 
-            if churn_count is not None:
-                total_churn += churn_count 
-                total_not_churn += (customers - churn_count)  
-                
-            # update churn per bulan
-            if month:
-                if month not in churn_data_per_month:
-                    churn_data_per_month[month] = 0
-                if is_churn is not None:
-                    if is_churn:
-                        churn_data_per_month[month] += customers  
-                if churn_count is not None:
-                    churn_data_per_month[month] += churn_count  
-                
-                total_customers_per_month[month] = total_customers_per_month.get(month, 0) + customers
-
-        # bar chart
-        churn_rate_per_month = []
-        for month in churn_data_per_month:
-            churn_rate = (churn_data_per_month[month] / total_customers_per_month[month]) * 100
-            churn_rate_per_month.append({
-                "month": month,
-                "churn_rate": round(churn_rate, 2)
-            })
-
-        # pie chart
-        churn_percent = round((total_churn / total_customers) * 100, 2) if total_customers > 0 else 0
-        not_churn_percent = 100 - churn_percent
-
-        return jsonify({
-            "pie_chart": {
-                "churn": churn_percent,  
-                "not_churn": not_churn_percent
-            },
-            "bar_chart": churn_rate_per_month,
-            "total_customer": total_customers,
-            "total_churn": total_churn, 
-            "churn_data_per_month": churn_data_per_month,
-            "total_customer_per_month": total_customers_per_month  
-        })
+        # agregat per bulan diperbarui setiap /predict dan /upload
+        return jsonify(cached_response(
+            "dashboard/chart", user_id, lambda: chart_summary(store.aggregates_for_user(user_id))
+        ))
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -355,88 +976,52 @@ def get_informations():
         if not user_id:
             return jsonify({"error": "user_id is required"}), 400
         
-        docs = db.collection("predictions").where("user_id", "==", user_id).stream()
-        
-        total_churn = 0
-        total_not_churn = 0
-        total_customers = 0
-        predictions_per_month = {}
-        
-        for doc in docs:
-            data = doc.to_dict()
-           
-            is_churn = data.get("is_churn", None)
-            churn_count = data.get("churn_count", None)
-            month = data.get("month", "")
-            customers = data.get("total_customers", 1)
-                        
-            total_customers += customers
-            
-            if not month:
-                continue
-            
-            if is_churn is not None:
-                if is_churn:
-                    total_churn += customers
-                else:
-                    total_not_churn += customers
-            elif churn_count is not None:
-                total_churn += churn_count
-                total_not_churn += (customers - churn_count)
-                
-            if month not in predictions_per_month:
-                predictions_per_month[month] = 0
-            predictions_per_month[month] += 1
-            
-        total_predictions_per_month = [
-            {
-                "month": month,
-                "total_predictions": predictions_per_month.get(month, 0)
-            }
-            for month in sorted(predictions_per_month.keys())
-        ]    
-    
-        return jsonify({
-            "information": {
-                    "total_customers": total_customers,
-                    "total_churn": total_churn,
-                    "total_not_churn": total_not_churn,
-                    "total_predictions_per_month": total_predictions_per_month,
-                }
-        })
+        return jsonify(cached_response(
+            "dashboard/informations", user_id, lambda: informations_summary(store.aggregates_for_user(user_id))
+        ))
     
     except Exception as e:
         return jsonify({"error": str(e)}), 500
         
 # Wordcloud
-def upload_to_storage(file, filename, folder="wordcloud_files"):
-    blob = bucket.blob(f"{folder}/{filename}")
-    blob.upload_from_file(file, content_type=file.content_type)
-    blob.make_public()
-    return blob.public_url
+def upload_to_storage(file, filename, folder="wordcloud_files", content_type=None):
+    return store.upload_file(
+        f"{folder}/{filename}", file, content_type=content_type or getattr(file, "content_type", None)
+    )
 
 def upload_wordcloud_image(image_bytes, filename):
-    blob = bucket.blob(filename)
-    blob.upload_from_string(image_bytes, content_type='image/png')
-    blob.make_public()
-    return blob.public_url
-
-def append_to_firestore_text(user_id, new_text):
-    doc_ref = db.collection("wordcloud").document(f"{user_id}_cumulative_wordcloud")
-    doc = doc_ref.get()
-    if doc.exists:
-        existing_text = doc.to_dict().get("text", "")
-        updated_text = existing_text + " " + new_text
-    else:
-        updated_text = new_text
-    doc_ref.set({"text": updated_text})
-
-def read_firestore_text(user_id):
-    doc_ref = db.collection("wordcloud").document(f"{user_id}_cumulative_wordcloud")
-    doc = doc_ref.get()
-    if doc.exists:
-        return doc.to_dict().get("text", "")
-    return ""
+    return store.upload_bytes(filename, image_bytes, content_type='image/png')
+
+def merge_wordcloud_frequencies(doc, new_text):
+    # dokumen menyimpan map kata -> jumlah (dibatasi top K), bukan teks kumulatif
+    stopwords = components.get("wordcloud").STOPWORDS
+    frequencies = doc.get("frequencies", {})
+    if doc.get("text"):
+        # dokumen lama masih berisi teks penuh, dikonversi sekali
+        frequencies = merge_frequencies(frequencies, tokenize(doc["text"], stopwords), WORDCLOUD_VOCAB_SIZE)
+
+    return merge_frequencies(frequencies, tokenize(new_text, stopwords), WORDCLOUD_VOCAB_SIZE)
+
+def get_wordcloud_renderer(quality):
+    # instance WordCloud (font, ukuran canvas) disimpan per thread dan dipakai ulang
+    renderers = _wordcloud_local.__dict__.setdefault("renderers", {})
+    if quality not in renderers:
+        options = WORDCLOUD_RENDER_MODES[quality]
+        renderers[quality] = components.get("wordcloud").WordCloud(
+            width=options["width"],
+            height=options["height"],
+            max_words=options["max_words"],
+            font_step=options["font_step"],
+            background_color=None,
+            mode="RGBA",
+        )
+    return renderers[quality]
+
+def render_wordcloud(frequencies, quality):
+    wc = get_wordcloud_renderer(quality).generate_from_frequencies(frequencies)
+    img_byte_arr = io.BytesIO()
+    wc.to_image().save(img_byte_arr, format='PNG')
+    return img_byte_arr.getvalue()
     
 @app.route('/wordcloud', methods=['POST'])
 def generate_wordcloud_from_model():
@@ -448,21 +1033,26 @@ def generate_wordcloud_from_model():
     if not user_id:
         return jsonify({"error": "user_id is required"}), 400
     
+    reasons = []
+
     # untuk input file
     if 'file' in request.files:
         file = request.files['file']
         filename = file.filename.lower()
 
-        if filename.endswith(".csv"):
-            df = pd.read_csv(file)
-        elif filename.endswith(".xls") or filename.endswith(".xlsx"):
-            df = pd.read_excel(file)
-        else:
-            return jsonify({"error": "Unsupported file format. Only CSV, XLS, XLSX allowed."}), 400
+        pd = components.get("pandas")
+        scoring = components.get("scoring")
+        if scoring.input_format(filename) is None:
+            return jsonify({"error": scoring.UNSUPPORTED_FORMAT_MESSAGE}), 400
 
-        df.columns = df.columns.str.lower().str.replace(' ', '_').str.replace('[^a-zA-Z0-9_]', '', regex=True)
+        # nama kolom sudah dinormalisasi oleh iter_chunks
+        chunks = list(scoring.iter_chunks(file, filename, UPLOAD_CHUNK_SIZE, csv_engine=UPLOAD_CSV_ENGINE))
+        df = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame()
         text_columns = df.select_dtypes(include=['object'])
-        text_from_file = " ".join(text_columns.fillna(' ').astype(str).agg(' '.join, axis=1).tolist())
+        row_texts = text_columns.fillna(' ').astype(str).agg(' '.join, axis=1).tolist()
+        text_from_file = " ".join(row_texts)
+        # alasan per baris untuk clustering: kolom churn_reason jika ada
+        reasons = df[REASON_COLUMN].tolist() if REASON_COLUMN in df.columns else row_texts
     
     # untuk input form
     if request.is_json:
@@ -474,25 +1064,41 @@ def generate_wordcloud_from_model():
     combined_input = f"{text_from_file} {form_text}".strip()
     if not combined_input:
         return jsonify({"error": "No valid text input from file or form."}), 400
+
+    if request.is_json:
+        quality = request.json.get("quality", WORDCLOUD_QUALITY)
+    else:
+        quality = request.form.get("quality", WORDCLOUD_QUALITY)
+    if quality not in WORDCLOUD_RENDER_MODES:
+        return jsonify({"error": f"Invalid quality. Expected one of: {list(WORDCLOUD_RENDER_MODES)}"}), 400
     
-    append_to_firestore_text(user_id, combined_input)
-    text = read_firestore_text(user_id)
-    
-    # membuat wordcloud
-    wc = WordCloud(width=800, height=400, background_color=None, mode="RGBA").generate(text)
+    doc = store.get_document("wordcloud", f"{user_id}_cumulative_wordcloud") or {}
+    frequencies = merge_wordcloud_frequencies(doc, combined_input)
+    if not frequencies:
+        return jsonify({"error": "No valid text input from file or form."}), 400
     
-    img_byte_arr = io.BytesIO()
-    wc.to_image().save(img_byte_arr, format='PNG')
-    img_byte_arr = img_byte_arr.getvalue()
+    # render ulang hanya jika kata-kata teratas (yang tampil di gambar) berubah
+    options = WORDCLOUD_RENDER_MODES[quality]
+    renders = doc.get("renders", {})
+    fingerprint = frequency_fingerprint(frequencies, options["max_words"], options)
+    previous = renders.get(quality)
+
+    if previous and previous.get("fingerprint") == fingerprint:
+        image_url = previous["image_url"]
+    else:
+        image_bytes = render_wordcloud(frequencies, quality)
+        image_url = upload_wordcloud_image(image_bytes, f"wordclouds/{user_id}_wordcloud{options['suffix']}.png")
+        renders[quality] = {"fingerprint": fingerprint, "image_url": image_url}
 
-    image_url = upload_wordcloud_image(img_byte_arr, f"wordclouds/{user_id}_wordcloud.png")
+    store.set_document("wordcloud", f"{user_id}_cumulative_wordcloud", {"frequencies": frequencies, "renders": renders})
+    # dicatat setelah semua validasi lolos, agar request yang ditolak (400) tidak ikut dihitung
+    record_reason_clusters(user_id, reason_clusterer.count_clusters(reasons + [form_text]))
 
     return jsonify({"image_url": image_url})
 
 # Cluster
-clustering_path = os.path.join("model", "kmeans7_model_joblib.pkl")
-clustering_data = joblib.load(clustering_path)
-clustering_model = clustering_data["model"]
+# Kolom alasan churn pada file upload (format snake_case)
+REASON_COLUMN = "churn_reason"
 
 cluster_descriptions = {
     0: 'Limited Services & Device Issues',
@@ -504,24 +1110,44 @@ cluster_descriptions = {
     6: 'Better Offers from Competitors'
 }
     
-@app.route("/cluster/chart", methods=["GET"])
-def get_clustering_data():
-    
-    labels = clustering_model.labels_
-    counts = {}
+def record_reason_clusters(user_id, counts):
+    # jumlah per cluster disimpan per user dan hanya ditambah (increment)
+    if not counts:
+        return
+    store.increment_document("cluster_counts", user_id, {str(cluster): count for cluster, count in counts.items()})
+    response_cache.invalidate_user(user_id)
 
-    for label in labels:
-        counts[label] = counts.get(label, 0) + 1
+def cluster_chart(user_id):
+    counts = store.get_document("cluster_counts", user_id) or {}
 
     output = []
     for cluster_num, desc in cluster_descriptions.items():
         output.append({
             "cluster": cluster_num,
             "description": desc,
-            "count": counts.get(cluster_num, 0)
+            "count": counts.get(str(cluster_num), 0)
         })
+    return output
+
+@app.route("/cluster/chart", methods=["GET"])
+def get_clustering_data():
+    try:
+        user_id = request.args.get("id")
 
-    return jsonify(output)
+        if not user_id:
+            return jsonify({"error": "user_id is required"}), 400
+
+        return jsonify(cached_response("cluster/chart", user_id, lambda: cluster_chart(user_id)))
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+USER_DATA_DEFAULT_PAGE_SIZE = 100
+USER_DATA_MAX_PAGE_SIZE = 1000
+
+def user_data_page(user_id, limit, fields, start_after=None, after_key=None):
+    user_data, position = page_predictions(store, user_id, limit, fields, start_after, after_key)
+    return {"user_data": user_data, "next_cursor": encode_cursor(*position) if position else None}
 
 @app.route("/user/data", methods=["GET"])
 def get_user_data():
@@ -531,20 +1157,121 @@ def get_user_data():
         if not user_id:
             return jsonify({"error": "user_id is required"}), 400
 
-        user_data_ref = db.collection("predictions").where("user_id", "==", user_id).stream()
-        
-        user_data = []
-        for doc in user_data_ref:
-            user_data.append(doc.to_dict())
-            
-        if not user_data:
+        try:
+            limit = min(int(request.args.get("limit", USER_DATA_DEFAULT_PAGE_SIZE)), USER_DATA_MAX_PAGE_SIZE)
+            if limit < 1:
+                raise ValueError
+        except ValueError:
+            return jsonify({"error": f"limit must be an integer between 1 and {USER_DATA_MAX_PAGE_SIZE}"}), 400
+
+        # projection: hanya field yang diminta yang dibaca dari storage (timestamp selalu ikut untuk cursor)
+        fields_param = request.args.get("fields", "")
+        fields = None
+        if fields_param:
+            fields = list(dict.fromkeys(["timestamp"] + [f.strip() for f in fields_param.split(",") if f.strip()]))
+
+        cursor = request.args.get("cursor")
+        if cursor:
+            try:
+                start_after, after_key = decode_cursor(cursor)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            return jsonify(user_data_page(user_id, limit, fields, start_after, after_key))
+
+        page = cached_response(
+            f"user/data?limit={limit}&fields={fields_param}", user_id,
+            lambda: user_data_page(user_id, limit, fields),
+        )
+        if not page["user_data"]:
             return jsonify({"error": "No data found for this user"}), 404
-        
-        return jsonify({"user_data": user_data})
+
+        return jsonify(page)
     
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-    
+
+# Model registry
+def is_model_admin():
+    # tanpa MODEL_ADMIN_TOKEN, model aktif/shadow tidak bisa diganti lewat API
+    if not MODEL_ADMIN_TOKEN:
+        return False
+    return hmac.compare_digest(request.headers.get("X-Admin-Token", ""), MODEL_ADMIN_TOKEN)
+
+@app.route("/models", methods=["GET"])
+def get_models():
+    return jsonify(models.stats())
+
+@app.route("/models/metadata", methods=["GET"])
+def get_model_metadata():
+    name = request.args.get("name")
+    try:
+        bundle = models.bundle(name) if name else models.active
+    except KeyError as e:
+        return jsonify({"error": e.args[0]}), 400
+    return precomputed_response(bundle.metadata_json)
+
+@app.route("/models/active", methods=["POST"])
+def set_active_model():
+    if not is_model_admin():
+        return jsonify({"error": "Forbidden"}), 403
+    try:
+        name = (request.get_json() or {}).get("name")
+        bundle = models.activate(name)
+        return jsonify({"status": "success", "active": bundle.name, "version": bundle.version})
+    except KeyError as e:
+        return jsonify({"error": e.args[0]}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/models/shadow", methods=["POST"])
+def set_shadow_model():
+    if not is_model_admin():
+        return jsonify({"error": "Forbidden"}), 403
+    try:
+        data = request.get_json() or {}
+        models.set_shadow(data.get("name"), data.get("sample_rate", SHADOW_SAMPLE_RATE))
+        stats = models.stats()
+        return jsonify({"status": "success", "shadow": stats["shadow"], "sample_rate": stats["shadow_sample_rate"]})
+    except KeyError as e:
+        return jsonify({"error": e.args[0]}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/predictions/write-buffer", methods=["GET"])
+def get_write_buffer_stats():
+    if PREDICTION_WRITE_MODE != "buffered":
+        return jsonify({"mode": PREDICTION_WRITE_MODE})
+    return jsonify({"mode": PREDICTION_WRITE_MODE, **components.get("prediction_writer").stats()})
+
+@app.route("/cache/stats", methods=["GET"])
+def get_cache_stats():
+    return jsonify(response_cache.stats())
+
+@app.route("/metrics", methods=["GET"])
+def get_metrics():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route("/startup", methods=["GET"])
+def get_startup_timings():
+    return jsonify({
+        "lazy_load": LAZY_LOAD,
+        "import_ms": import_ms,
+        "components": components.status()
+    })
+
+# File lokal hanya disajikan jika memakai backend local
+@app.route("/blobs/<path:path>", methods=["GET"])
+def get_local_blob(path):
+    blob_dir = getattr(components.get("store"), "blob_dir", None)
+    if blob_dir is None:
+        abort(404)
+    return send_from_directory(blob_dir, path)
+
+if not LAZY_LOAD:
+    components.preload(PRELOAD_COMPONENTS)
+
+import_ms = round((time.perf_counter() - _import_started) * 1000.0, 2)
+
 if __name__ == "__main__":
     app.run(debug=True)
\ No newline at end of file
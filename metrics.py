@@ -0,0 +1,250 @@
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key, extra=()):
+    items = list(key) + list(extra)
+    if not items:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in items) + "}"
+
+
+class _Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+
+# Histogram dan counter sederhana per proses, dirender dalam format text
+# Prometheus untuk /metrics
+class Metrics:
+    def __init__(self, prefix="staysense", buckets=DEFAULT_BUCKETS):
+        self.prefix = prefix
+        self.buckets = tuple(buckets)
+        self._histograms = {}
+        self._counters = {}
+        self._help = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def describe(self, name, text):
+        self._help[name] = text
+
+    def observe(self, name, seconds, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = _Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def inc(self, name, value=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    # route yang sedang diproses thread ini, dipakai sebagai label stage
+    def set_route(self, route):
+        self._local.route = route
+
+    @property
+    def route(self):
+        return getattr(self._local, "route", None) or "none"
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe("stage_duration_seconds", time.perf_counter() - started, route=self.route, stage=name)
+
+    def timed_iter(self, name, iterable, on_done=None):
+        # waktu yang dihabiskan di next() (mis. parsing chunk file) dicatat sebagai satu stage
+        iterator = iter(iterable)
+        elapsed = 0.0
+        try:
+            while True:
+                started = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    elapsed += time.perf_counter() - started
+                yield item
+        finally:
+            self.observe("stage_duration_seconds", elapsed, route=self.route, stage=name)
+            if on_done is not None:
+                on_done(elapsed)
+
+    def render(self):
+        with self._lock:
+            histograms = {
+                name: {key: (list(h.counts), h.count, h.sum) for key, h in series.items()}
+                for name, series in self._histograms.items()
+            }
+            counters = {name: dict(series) for name, series in self._counters.items()}
+
+        lines = []
+        for name, series in sorted(counters.items()):
+            full_name = f"{self.prefix}_{name}"
+            if name in self._help:
+                lines.append(f"# HELP {full_name} {self._help[name]}")
+            lines.append(f"# TYPE {full_name} counter")
+            for key, value in sorted(series.items()):
+                lines.append(f"{full_name}{_format_labels(key)} {value}")
+
+        for name, series in sorted(histograms.items()):
+            full_name = f"{self.prefix}_{name}"
+            if name in self._help:
+                lines.append(f"# HELP {full_name} {self._help[name]}")
+            lines.append(f"# TYPE {full_name} histogram")
+            for key, (counts, count, total) in sorted(series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    lines.append(f"{full_name}_bucket{_format_labels(key, [('le', repr(bound))])} {cumulative}")
+                lines.append(f"{full_name}_bucket{_format_labels(key, [('le', '+Inf')])} {count}")
+                lines.append(f"{full_name}_sum{_format_labels(key)} {total}")
+                lines.append(f"{full_name}_count{_format_labels(key)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+# Proxy storage: setiap panggilan method dicatat ke histogram storage_call_duration_seconds.
+# Untuk method yang mengembalikan generator (query .stream()), waktu dihitung sampai habis dibaca.
+class InstrumentedStore:
+    def __init__(self, store, metrics):
+        self._store = store
+        self._metrics = metrics
+
+    def __getattr__(self, name):
+        attr = getattr(self._store, name)
+        if not callable(attr):
+            return attr
+
+        metrics = self._metrics
+
+        def call(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                result = attr(*args, **kwargs)
+            except Exception:
+                metrics.inc("storage_errors_total", method=name)
+                raise
+            if hasattr(result, "__next__") and not hasattr(result, "read"):
+                return self._timed_generator(name, result, time.perf_counter() - started)
+            metrics.observe("storage_call_duration_seconds", time.perf_counter() - started, method=name)
+            return result
+
+        return call
+
+    def _timed_generator(self, name, generator, elapsed):
+        try:
+            while True:
+                started = time.perf_counter()
+                try:
+                    item = next(generator)
+                except StopIteration:
+                    return
+                finally:
+                    elapsed += time.perf_counter() - started
+                yield item
+        finally:
+            self._metrics.observe("storage_call_duration_seconds", elapsed, method=name)
+
+
+# Profiler sampling untuk request lambat: stack thread request diambil setiap
+# interval_ms, dan jika request melebihi slow_ms hasilnya ditulis dalam format
+# folded stack ("a;b;c 12") yang bisa langsung dibuat flame graph
+# (flamegraph.pl, speedscope, inferno).
+class SlowRequestProfiler:
+    def __init__(self, slow_ms, interval_ms=5.0, sample_rate=1.0, output_dir="profiles"):
+        self.slow_ms = float(slow_ms)
+        self.interval = max(float(interval_ms), 0.5) / 1000.0
+        self.sample_rate = float(sample_rate)
+        self.output_dir = output_dir
+        self._active = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self.dumped = 0
+
+    def start(self):
+        # dipanggil di awal request; hanya sebagian request yang disampling
+        if random.random() >= self.sample_rate:
+            return
+        thread_id = threading.get_ident()
+        with self._lock:
+            self._active[thread_id] = Counter()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="slow-request-profiler", daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+
+    def stop(self, elapsed_ms, label, thread_id=None):
+        # thread_id: thread yang memanggil start(), bila stop dipanggil dari thread lain
+        with self._lock:
+            stacks = self._active.pop(thread_id or threading.get_ident(), None)
+        if stacks is None or elapsed_ms < self.slow_ms or not stacks:
+            return None
+        os.makedirs(self.output_dir, exist_ok=True)
+        safe_label = "".join(ch if ch.isalnum() else "_" for ch in label).strip("_") or "request"
+        path = os.path.join(self.output_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{safe_label}-{int(elapsed_ms)}ms.folded")
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        self.dumped += 1
+        return path
+
+    def _run(self):
+        while True:
+            with self._lock:
+                thread_ids = list(self._active)
+            if not thread_ids:
+                self._wakeup.wait()
+                self._wakeup.clear()
+                continue
+            frames = sys._current_frames()
+            samples = {thread_id: _folded_stack(frames[thread_id]) for thread_id in thread_ids if thread_id in frames}
+            with self._lock:
+                for thread_id, stack in samples.items():
+                    if thread_id in self._active:
+                        self._active[thread_id][stack] += 1
+            time.sleep(self.interval)
+
+
+def _folded_stack(frame):
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
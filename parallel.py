@@ -0,0 +1,219 @@
+import io
+import multiprocessing
+import os
+import re
+import threading
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+# Scoring paralel untuk upload CSV besar: file dipotong menjadi rentang byte di
+# batas baris, lalu tiap rentang di-parse, di-encode dan diprediksi di process
+# pool. Model dimuat sekali per worker. Probabilitas dikirim balik ke proses
+# utama sebagai array numpy lewat shared memory, bukan DataFrame yang di-pickle.
+
+_worker = {}
+
+
+def _snake(name):
+    return re.sub(r"[\s/]+", "_", name).lower()
+
+
+def _init_worker(model_path, native, threshold, clustering_path, dedupe, chunksize, csv_engine):
+    import joblib
+
+    from encoding import FeatureEncoder
+
+    bundle = joblib.load(model_path)
+    encoder = {_snake(k): v for k, v in bundle["label_encoders"].items()}
+    columns = [_snake(col) for col in bundle["columns"]]
+    model = bundle["model"]
+    if native:
+        from booster import NativeBoosterScorer
+
+        scorer = NativeBoosterScorer(model, nthread=1)
+    else:
+        # satu thread per proses, paralelisme dari jumlah proses
+        if hasattr(model, "get_booster"):
+            model.set_params(n_jobs=1)
+        scorer = model
+    _worker.update(
+        feature_encoder=FeatureEncoder(encoder, columns),
+        scorer=scorer,
+        threshold=threshold,
+        clustering_path=clustering_path,
+        clusterer=None,
+        dedupe=dedupe,
+        chunksize=chunksize,
+        csv_engine=csv_engine,
+    )
+
+
+def _clusterer():
+    if _worker["clusterer"] is None:
+        import joblib
+
+        from clustering import ReasonClusterer
+
+        _worker["clusterer"] = ReasonClusterer(joblib.load(_worker["clustering_path"]))
+    return _worker["clusterer"]
+
+
+def _share(values):
+    shm = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+    np.ndarray(values.shape, dtype=values.dtype, buffer=shm.buf)[:] = values
+    # pemilik shared memory adalah proses utama (yang melakukan unlink)
+    resource_tracker.unregister(shm._name, "shared_memory")
+    shm.close()
+    return shm.name
+
+
+def _score_range(path, header, start, end, reason_column):
+    from scoring import iter_chunks, predict_unique
+
+    feature_encoder = _worker["feature_encoder"]
+    predict_proba = _worker["scorer"].predict_proba
+    wanted = feature_encoder.columns + [reason_column]
+
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = header + f.read(end - start)
+
+    parts = []
+    unique_rows = 0
+    reason_counts = Counter()
+    chunks = iter_chunks(
+        io.BytesIO(data), "range.csv", _worker["chunksize"], wanted=wanted,
+        dtypes=feature_encoder.dtypes, csv_engine=_worker["csv_engine"],
+    )
+    for chunk in chunks:
+        missing_cols = [col for col in feature_encoder.columns if col not in chunk.columns]
+        if missing_cols:
+            raise ValueError(f"Missing columns: {missing_cols}")
+        input_data = feature_encoder.encode_frame(chunk)
+        if _worker["dedupe"]:
+            proba, unique = predict_unique(predict_proba, input_data)
+        else:
+            proba, unique = predict_proba(input_data), len(input_data)
+        parts.append(np.asarray(proba[:, 1]))
+        unique_rows += unique
+        if reason_column in chunk.columns:
+            reason_counts.update(_clusterer().count_clusters(chunk[reason_column]))
+
+    # dtype asli (float32 untuk XGBoost) dipertahankan agar perbandingan dengan
+    # threshold sama persis dengan jalur satu proses
+    proba = np.concatenate(parts) if parts else np.empty(0, dtype=np.float32)
+    return _share(proba), len(proba), proba.dtype.str, unique_rows, dict(reason_counts)
+
+
+def split_csv(path, parts):
+    # Batas rentang digeser ke akhir baris berikutnya yang tidak berada di dalam
+    # field ber-kutip (jumlah tanda kutip sebelum newline harus genap).
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        header = f.readline()
+        start = len(header)
+        offsets = [start]
+        pos = start
+        parity = 0
+        for i in range(1, parts):
+            target = start + (size - start) * i // parts
+            if target <= pos:
+                continue
+            while pos < target:
+                block = f.read(min(1 << 20, target - pos))
+                parity ^= block.count(b'"') & 1
+                pos += len(block)
+            while True:
+                line = f.readline()
+                if not line:
+                    break
+                parity ^= line.count(b'"') & 1
+                pos += len(line)
+                if parity == 0:
+                    break
+            if pos >= size:
+                break
+            offsets.append(pos)
+    offsets.append(size)
+    ranges = [(lo, hi) for lo, hi in zip(offsets, offsets[1:]) if hi > lo]
+    return header, ranges
+
+
+class ParallelScorer:
+    def __init__(self, model_path, native, threshold, clustering_path, workers, dedupe=False,
+                 chunksize=50_000, range_bytes=64 << 20, csv_engine="pyarrow"):
+        self.workers = workers
+        self.threshold = threshold
+        self.range_bytes = range_bytes
+        # jumlah upload yang sedang memakai pool; pool yang sudah di-retire baru
+        # dimatikan setelah pemakai terakhir selesai
+        self._users = 0
+        self._retired = False
+        self._lock = threading.Lock()
+        # spawn: worker tidak mewarisi thread/koneksi (Firebase, gRPC) dari proses server
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(model_path, native, threshold, clustering_path, dedupe, chunksize, csv_engine),
+        )
+
+    def score_csv(self, path, reason_column, progress=None):
+        parts = max(self.workers, -(-os.path.getsize(path) // self.range_bytes))
+        header, ranges = split_csv(path, parts)
+        futures = [
+            self._executor.submit(_score_range, path, header, start, end, reason_column) for start, end in ranges
+        ]
+
+        total_customers = 0
+        churn_count = 0
+        unique_rows = 0
+        reason_counts = Counter()
+        error = None
+        for future in as_completed(futures):
+            try:
+                name, rows, dtype, unique, counts = future.result()
+            except Exception as e:
+                error = error or e
+                continue
+            shm = shared_memory.SharedMemory(name=name)
+            try:
+                proba = np.ndarray((rows,), dtype=np.dtype(dtype), buffer=shm.buf)
+                churn_count += int(np.sum(proba > self.threshold))
+                del proba
+            finally:
+                shm.close()
+                shm.unlink()
+            total_customers += rows
+            unique_rows += unique
+            reason_counts.update(counts)
+            if progress is not None and error is None:
+                progress(total_customers)
+
+        if error is not None:
+            raise error
+        return total_customers, churn_count, unique_rows, reason_counts
+
+    def acquire(self):
+        with self._lock:
+            self._users += 1
+
+    def release(self):
+        with self._lock:
+            self._users -= 1
+            idle = self._retired and self._users == 0
+        if idle:
+            self.close()
+
+    def retire(self):
+        with self._lock:
+            self._retired = True
+            idle = self._users == 0
+        if idle:
+            self.close()
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,207 @@
+import gzip
+import hashlib
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from encoding import FeatureEncoder
+
+
+def file_version(name, path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return f"{name}-{digest.hexdigest()[:12]}"
+
+
+# Response JSON yang diserialisasi sekali: body, versi gzip dan ETag dari isi body
+class PrecomputedJSON:
+    def __init__(self, payload):
+        self.body = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+        self.gzip_body = gzip.compress(self.body, mtime=0)
+        self.etag = hashlib.sha256(self.body).hexdigest()[:32]
+
+
+class ModelBundle:
+    def __init__(self, name, version, model, scorer, encoder, columns, threshold):
+        self.name = name
+        self.version = version
+        self.model = model
+        self.scorer = scorer
+        self.encoder = encoder
+        self.columns = columns
+        self.threshold = threshold
+        self.feature_encoder = FeatureEncoder(encoder, columns)
+        # metadata dibangun sekali per bundle; model baru = bundle baru = metadata baru
+        self.metadata = {
+            "name": name,
+            "version": version,
+            "threshold": float(threshold),
+            "columns": list(columns),
+            "valid_values": self.feature_encoder.valid_values,
+        }
+        self.valid_values_json = PrecomputedJSON(self.feature_encoder.valid_values)
+        self.metadata_json = PrecomputedJSON(self.metadata)
+
+
+class _TimedScorer:
+    def __init__(self, registry, bundle):
+        self._registry = registry
+        self._bundle = bundle
+
+    def predict_proba(self, input_data):
+        return self._registry.score(self._bundle, input_data)
+
+
+def _new_stats():
+    return {
+        "calls": 0,
+        "rows": 0,
+        "latency_ms_total": 0.0,
+        "latency_ms_max": 0.0,
+        "shadow_rows": 0,
+        "shadow_abs_diff_total": 0.0,
+        "shadow_abs_diff_max": 0.0,
+        "shadow_flag_mismatches": 0,
+        "shadow_errors": 0,
+        "shadow_dropped": 0,
+    }
+
+
+# Registry model bernama (model, label_encoders, columns, threshold) yang dimuat
+# saat dibutuhkan. Model aktif diganti dengan menukar satu referensi, sehingga
+# request yang sedang berjalan tetap memakai bundle yang sudah diambilnya.
+class ModelRegistry:
+    def __init__(self, paths, loader, active_name, shadow_name=None, shadow_sample_rate=0.0, shadow_queue_size=8,
+                 scoring_workers=0):
+        self.paths = dict(paths)
+        self._loader = loader
+        # scoring_workers > 0: predict_proba dijalankan di executor terpisah sehingga
+        # thread request yang menunggu I/O tidak ikut berebut CPU untuk scoring
+        self._scoring_executor = None
+        if scoring_workers > 0:
+            self._scoring_executor = ThreadPoolExecutor(max_workers=scoring_workers, thread_name_prefix="scoring")
+        self._bundles = {}
+        self._load_locks = {name: threading.Lock() for name in self.paths}
+        self._lock = threading.Lock()
+        self._stats = {name: _new_stats() for name in self.paths}
+        self._shadow = None
+        self._shadow_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shadow-scoring")
+        self._shadow_slots = threading.BoundedSemaphore(max(1, int(shadow_queue_size)))
+        self.active = None
+        self.activate(active_name)
+        if shadow_name:
+            self.set_shadow(shadow_name, shadow_sample_rate)
+
+    def bundle(self, name):
+        if name not in self.paths:
+            raise KeyError(f"Unknown model '{name}'. Expected one of: {list(self.paths)}")
+        bundle = self._bundles.get(name)
+        if bundle is None:
+            with self._load_locks[name]:
+                bundle = self._bundles.get(name)
+                if bundle is None:
+                    bundle = self._loader(name, self.paths[name])
+                    self._bundles[name] = bundle
+        return bundle
+
+    def activate(self, name):
+        # load dulu di luar swap, baru referensi aktif diganti (atomik)
+        bundle = self.bundle(name)
+        self.active = bundle
+        return bundle
+
+    def set_shadow(self, name, sample_rate):
+        if name:
+            self.bundle(name)
+            self._shadow = (name, min(max(float(sample_rate), 0.0), 1.0))
+        else:
+            self._shadow = None
+
+    def timed_scorer(self, bundle):
+        return _TimedScorer(self, bundle)
+
+    def score(self, bundle, input_data):
+        started = time.perf_counter()
+        if self._scoring_executor is not None:
+            proba = self._scoring_executor.submit(bundle.scorer.predict_proba, input_data).result()
+        else:
+            proba = bundle.scorer.predict_proba(input_data)
+        self._record_latency(bundle.name, len(input_data), (time.perf_counter() - started) * 1000.0)
+        return proba
+
+    def _record_latency(self, name, rows, elapsed_ms):
+        with self._lock:
+            stats = self._stats[name]
+            stats["calls"] += 1
+            stats["rows"] += rows
+            stats["latency_ms_total"] += elapsed_ms
+            stats["latency_ms_max"] = max(stats["latency_ms_max"], elapsed_ms)
+
+    def shadow(self, raw, primary, primary_proba):
+        # raw: dict (satu customer) atau DataFrame (chunk upload) sebelum encoding
+        shadow = self._shadow
+        if shadow is None or shadow[0] == primary.name:
+            return
+        name, sample_rate = shadow
+        if random.random() >= sample_rate:
+            return
+        if not self._shadow_slots.acquire(blocking=False):
+            with self._lock:
+                self._stats[name]["shadow_dropped"] += 1
+            return
+        primary_proba = np.atleast_1d(np.asarray(primary_proba, dtype=np.float64)).copy()
+        try:
+            self._shadow_executor.submit(self._run_shadow, name, raw, primary, primary_proba)
+        except Exception:
+            self._shadow_slots.release()
+            raise
+
+    def _run_shadow(self, name, raw, primary, primary_proba):
+        try:
+            bundle = self.bundle(name)
+            if isinstance(raw, dict):
+                input_data = bundle.feature_encoder.encode_row(raw)
+            else:
+                input_data = bundle.feature_encoder.encode_frame(raw)
+            proba = self.score(bundle, input_data)[:, 1]
+            diff = np.abs(proba - primary_proba)
+            mismatches = int(np.sum((proba > bundle.threshold) != (primary_proba > primary.threshold)))
+            with self._lock:
+                stats = self._stats[name]
+                stats["shadow_rows"] += len(diff)
+                stats["shadow_abs_diff_total"] += float(diff.sum())
+                stats["shadow_abs_diff_max"] = max(stats["shadow_abs_diff_max"], float(diff.max()))
+                stats["shadow_flag_mismatches"] += mismatches
+        except Exception:
+            with self._lock:
+                self._stats[name]["shadow_errors"] += 1
+        finally:
+            self._shadow_slots.release()
+
+    def stats(self):
+        with self._lock:
+            snapshot = {name: dict(stats) for name, stats in self._stats.items()}
+        shadow = self._shadow
+        models = {}
+        for name, stats in snapshot.items():
+            bundle = self._bundles.get(name)
+            stats["loaded"] = bundle is not None
+            stats["version"] = bundle.version if bundle else None
+            stats["threshold"] = bundle.threshold if bundle else None
+            stats["avg_latency_ms"] = round(stats["latency_ms_total"] / stats["calls"], 4) if stats["calls"] else 0
+            stats["shadow_mean_abs_diff"] = (
+                round(stats["shadow_abs_diff_total"] / stats["shadow_rows"], 6) if stats["shadow_rows"] else 0
+            )
+            models[name] = stats
+        return {
+            "active": self.active.name,
+            "shadow": shadow[0] if shadow else None,
+            "shadow_sample_rate": shadow[1] if shadow else 0.0,
+            "models": models,
+        }
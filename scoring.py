@@ -0,0 +1,422 @@
+import csv
+import functools
+import io
+import re
+
+import numpy as np
+import pandas as pd
+
+# ukuran blok baca parser CSV pyarrow (byte)
+CSV_BLOCK_SIZE = 8 << 20
+
+# regex normalisasi nama kolom dikompilasi sekali, hasil per nama di-cache
+_NON_WORD = re.compile("[^a-zA-Z0-9_]")
+
+INPUT_FORMATS = (".csv", ".xls", ".xlsx", ".parquet", ".arrow", ".feather")
+UNSUPPORTED_FORMAT_MESSAGE = "Unsupported file format. Only CSV, XLS, XLSX, Parquet, Arrow allowed."
+
+
+@functools.lru_cache(maxsize=4096)
+def normalize_name(name):
+    return _NON_WORD.sub("", str(name).lower().replace(" ", "_"))
+
+
+def normalize_columns(names):
+    return [normalize_name(name) for name in names]
+
+
+def input_format(filename):
+    for ext in INPUT_FORMATS:
+        if filename.endswith(ext):
+            return "arrow" if ext == ".feather" else ext[1:]
+    return None
+
+
+def _arrow_type(dtype):
+    import pyarrow as pa
+
+    if dtype == "category":
+        return pa.dictionary(pa.int32(), pa.string())
+    return pa.float32()
+
+
+def _selected(names, wanted):
+    # nama kolom asli yang (setelah dinormalisasi) dibutuhkan
+    return [name for name in names if wanted is None or normalize_name(name) in wanted]
+
+
+def _rechunk(batches, chunksize):
+    import pyarrow as pa
+
+    pending = []
+    rows = 0
+    for batch in batches:
+        offset = 0
+        while offset < batch.num_rows:
+            take = min(chunksize - rows, batch.num_rows - offset)
+            pending.append(batch.slice(offset, take))
+            rows += take
+            offset += take
+            if rows >= chunksize:
+                yield pa.Table.from_batches(pending)
+                pending = []
+                rows = 0
+    if pending:
+        yield pa.Table.from_batches(pending)
+
+
+def _to_frame(table, dtypes):
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    if dtypes:
+        columns = []
+        for name, column in zip(table.column_names, table.columns):
+            dtype = dtypes.get(normalize_name(name))
+            if dtype == "float32" and (pa.types.is_integer(column.type) or pa.types.is_floating(column.type)):
+                column = column.cast(pa.float32())
+            elif dtype == "category" and (pa.types.is_string(column.type) or pa.types.is_large_string(column.type)):
+                column = pc.dictionary_encode(column)
+            columns.append(column)
+        table = pa.table(columns, names=table.column_names)
+    frame = table.to_pandas()
+    frame.columns = normalize_columns(frame.columns)
+    return frame
+
+
+def _csv_header(file):
+    start = file.tell()
+    line = file.readline()
+    file.seek(start)
+    if isinstance(line, bytes):
+        line = line.decode("utf-8-sig")
+    return next(csv.reader([line]), [])
+
+
+def _iter_csv_chunks(file, chunksize, wanted, dtypes=None):
+    # hanya kolom yang dibutuhkan model yang dibaca
+    usecols = None
+    if wanted is not None:
+        usecols = lambda name: normalize_name(name) in wanted
+    for chunk in pd.read_csv(file, chunksize=chunksize, usecols=usecols):
+        chunk.columns = normalize_columns(chunk.columns)
+        yield chunk
+
+
+def _iter_csv_chunks_pyarrow(file, chunksize, wanted, dtypes=None):
+    # parser CSV multithread pyarrow; proyeksi kolom dan tipe ditentukan di depan
+    import pyarrow as pa
+    from pyarrow import csv as pa_csv
+
+    include = _selected(_csv_header(file), wanted)
+    column_types = {}
+    for name in include:
+        dtype = (dtypes or {}).get(normalize_name(name))
+        if dtype:
+            column_types[name] = _arrow_type(dtype)
+    try:
+        reader = pa_csv.open_csv(
+            file,
+            read_options=pa_csv.ReadOptions(use_threads=True, block_size=CSV_BLOCK_SIZE),
+            convert_options=pa_csv.ConvertOptions(include_columns=include, column_types=column_types),
+        )
+        for table in _rechunk(reader, chunksize):
+            yield _to_frame(table, None)
+    except pa.ArrowInvalid as e:
+        raise ValueError(f"Invalid CSV data: {e}")
+
+
+def _iter_parquet_chunks(file, chunksize, wanted, dtypes=None):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    names = pq.ParquetFile(file).schema_arrow.names
+    columns = _selected(names, wanted)
+    # kolom kategori dibaca langsung sebagai dictionary (tanpa materialisasi string per baris)
+    read_dictionary = [name for name in columns if (dtypes or {}).get(normalize_name(name)) == "category"]
+    parquet_file = pq.ParquetFile(file, read_dictionary=read_dictionary)
+    for batch in parquet_file.iter_batches(batch_size=chunksize, columns=columns):
+        yield _to_frame(pa.Table.from_batches([batch]), dtypes)
+
+
+def _iter_arrow_chunks(file, chunksize, wanted, dtypes=None):
+    import pyarrow as pa
+
+    try:
+        reader = pa.ipc.open_file(file)
+        batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+    except pa.ArrowInvalid:
+        # Arrow IPC stream format
+        file.seek(0)
+        reader = pa.ipc.open_stream(file)
+        batches = reader
+    columns = _selected(reader.schema.names, wanted)
+    for table in _rechunk((batch.select(columns) for batch in batches), chunksize):
+        yield _to_frame(table, dtypes)
+
+
+def _iter_xlsx_chunks(file, chunksize, wanted, dtypes=None):
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        names = normalize_columns(["" if h is None else h for h in header])
+        keep = [i for i, name in enumerate(names) if wanted is None or name in wanted]
+        keep_names = [names[i] for i in keep]
+
+        buffer = []
+        for row in rows:
+            # baris kosong dilewati seperti pd.read_excel
+            if all(value is None for value in row):
+                continue
+            buffer.append([row[i] if i < len(row) else None for i in keep])
+            if len(buffer) >= chunksize:
+                yield pd.DataFrame(buffer, columns=keep_names)
+                buffer = []
+        if buffer:
+            yield pd.DataFrame(buffer, columns=keep_names)
+    finally:
+        workbook.close()
+
+
+def _iter_xls_chunks(file, chunksize, wanted, dtypes=None):
+    # format .xls lama tidak bisa dibaca per baris, dipotong setelah dibaca
+    df = pd.read_excel(file)
+    df.columns = normalize_columns(df.columns)
+    if wanted is not None:
+        df = df[[col for col in df.columns if col in wanted]]
+    for start in range(0, len(df), chunksize):
+        yield df.iloc[start:start + chunksize]
+
+
+def iter_chunks(file, filename, chunksize, wanted=None, dtypes=None, csv_engine="pyarrow"):
+    # dtypes: {kolom: "category" | "float32"} untuk kolom yang tipenya sudah pasti
+    wanted = set(wanted) if wanted is not None else None
+    readers = {
+        "csv": _iter_csv_chunks_pyarrow if csv_engine == "pyarrow" else _iter_csv_chunks,
+        "xlsx": _iter_xlsx_chunks,
+        "xls": _iter_xls_chunks,
+        "parquet": _iter_parquet_chunks,
+        "arrow": _iter_arrow_chunks,
+    }
+    fmt = input_format(filename)
+    if fmt is None:
+        raise ValueError(UNSUPPORTED_FORMAT_MESSAGE)
+    return readers[fmt](file, chunksize, wanted, dtypes)
+
+
+RESULTS_FORMATS = {"csv": ".csv", "parquet": ".parquet", "arrow": ".arrow"}
+RESULTS_CONTENT_TYPES = {
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.file",
+}
+# Kolom hasil dari model; kolom lain di artifact adalah kolom id (string)
+RESULTS_VALUE_COLUMNS = ("row", "churn_probability", "is_churn")
+# Jumlah baris tetap per record batch Arrow (kecuali batch terakhir), dicatat di
+# metadata schema sehingga range baris bisa dihitung tanpa membaca batch
+ARROW_BATCH_ROWS = 65536
+
+
+# Penulis hasil per baris. Parquet: satu row group per chunk, Arrow IPC (file
+# format): record batch berukuran tetap ARROW_BATCH_ROWS, sehingga range baris
+# bisa dibaca ulang tanpa membaca seluruh file.
+class ResultsWriter:
+    def __init__(self, file, fmt):
+        if fmt not in RESULTS_FORMATS:
+            raise ValueError(f"Unsupported results format: {fmt}. Expected one of: {list(RESULTS_FORMATS)}")
+        self.file = file
+        self.fmt = fmt
+        self._writer = None
+        self._header = True
+        self._pending = []
+        self._pending_rows = 0
+        if fmt == "csv":
+            self.file = io.TextIOWrapper(file, encoding="utf-8", newline="")
+
+    def write(self, frame):
+        if self.fmt == "csv":
+            frame.to_csv(self.file, header=self._header, index=False)
+            self._header = False
+            return
+
+        import pyarrow as pa
+
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        if self._writer is None:
+            # kolom id selalu string: chunk pertama yang kosong semua akan terbaca sebagai null
+            schema = pa.schema([
+                field if field.name in RESULTS_VALUE_COLUMNS else field.with_type(pa.string())
+                for field in table.schema
+            ], metadata=table.schema.metadata)
+            if self.fmt == "parquet":
+                import pyarrow.parquet as pq
+
+                self._schema = schema
+                self._writer = pq.ParquetWriter(self.file, self._schema)
+            else:
+                self._schema = schema.with_metadata({**schema.metadata, b"batch_rows": str(ARROW_BATCH_ROWS).encode()})
+                self._writer = pa.ipc.new_file(self.file, self._schema)
+        table = table.cast(self._schema)
+        if self.fmt == "parquet":
+            self._writer.write_table(table)
+            return
+
+        # baris ditampung sampai cukup untuk satu batch penuh
+        self._pending.append(table)
+        self._pending_rows += len(table)
+        if self._pending_rows >= ARROW_BATCH_ROWS:
+            self._write_arrow(final=False)
+
+    def _write_arrow(self, final):
+        import pyarrow as pa
+
+        table = pa.concat_tables(self._pending)
+        full = len(table) if final else len(table) - len(table) % ARROW_BATCH_ROWS
+        if full:
+            self._writer.write_table(table.slice(0, full).combine_chunks(), max_chunksize=ARROW_BATCH_ROWS)
+        rest = table.slice(full)
+        self._pending = [rest] if len(rest) else []
+        self._pending_rows = len(rest)
+
+    def close(self):
+        if self.fmt == "csv":
+            self.file.flush()
+            self.file.detach()
+        elif self._writer is not None:
+            if self._pending:
+                self._write_arrow(final=True)
+            self._writer.close()
+
+
+def results_frame(chunk, proba, churn_flags, first_row, id_columns=()):
+    frame = pd.DataFrame({
+        col: chunk[col].astype("string").to_numpy() for col in id_columns if col in chunk.columns
+    })
+    frame["row"] = np.arange(first_row, first_row + len(proba))
+    frame["churn_probability"] = proba
+    frame["is_churn"] = churn_flags
+    return frame
+
+
+def predict_unique(predict_proba, input_data):
+    # baris identik (customer duplikat di export) hanya diprediksi sekali
+    if len(input_data) < 2:
+        return predict_proba(input_data), len(input_data)
+    input_data = np.ascontiguousarray(input_data)
+    rows = input_data.view(np.dtype((np.void, input_data.dtype.itemsize * input_data.shape[1]))).ravel()
+    _, first, inverse = np.unique(rows, return_index=True, return_inverse=True)
+    if len(first) == len(input_data):
+        return predict_proba(input_data), len(first)
+    return predict_proba(input_data[first])[inverse], len(first)
+
+
+def score_chunks(chunks, feature_encoder, predict_proba, threshold, results_writer=None, progress=None, on_chunk=None,
+                 id_columns=()):
+    # Hanya hitungan churn yang disimpan, hasil per baris ditulis langsung ke results_writer
+    total_customers = 0
+    churn_count = 0
+    for chunk in chunks:
+        missing_cols = [col for col in feature_encoder.columns if col not in chunk.columns]
+        if missing_cols:
+            raise ValueError(f"Missing columns: {missing_cols}")
+
+        input_data = feature_encoder.encode_frame(chunk)
+        proba = predict_proba(input_data)[:, 1]
+        churn_flags = proba > threshold
+
+        if results_writer is not None:
+            results_writer.write(results_frame(chunk, proba, churn_flags, total_customers, id_columns))
+
+        if on_chunk is not None:
+            on_chunk(chunk, proba)
+
+        total_customers += len(proba)
+        churn_count += int(np.sum(churn_flags))
+        if progress is not None:
+            progress(total_customers)
+
+    return total_customers, churn_count
+
+
+def results_format(filename):
+    for fmt, ext in RESULTS_FORMATS.items():
+        if filename.endswith(ext):
+            return fmt
+    return None
+
+
+def _parquet_parts(file, columns):
+    import pyarrow.parquet as pq
+
+    parquet_file = pq.ParquetFile(file)
+    metadata = parquet_file.metadata
+    for i in range(metadata.num_row_groups):
+        size = metadata.row_group(i).num_rows
+        yield size, lambda i=i: parquet_file.read_row_group(i, columns=columns)
+
+
+def _arrow_parts(file, columns):
+    import pyarrow as pa
+
+    reader = pa.ipc.open_file(file)
+    schema = reader.schema
+    if columns:
+        # hanya buffer kolom yang diminta yang dibaca
+        options = pa.ipc.IpcReadOptions(included_fields=[schema.get_field_index(col) for col in columns])
+        reader = pa.ipc.open_file(file, options=options)
+    names = columns or schema.names
+
+    def read(i):
+        return pa.Table.from_batches([reader.get_batch(i)]).select(names)
+
+    batch_rows = int((schema.metadata or {}).get(b"batch_rows", 0))
+    for i in range(reader.num_record_batches):
+        if batch_rows:
+            # ukuran batch tetap (batch terakhir bisa lebih kecil): batch tidak perlu dibaca
+            yield batch_rows, lambda i=i: read(i)
+        else:
+            # artifact lama tanpa metadata batch_rows
+            table = read(i)
+            yield len(table), lambda table=table: table
+
+
+def results_schema(file, fmt):
+    import pyarrow as pa
+
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+
+        return pq.ParquetFile(file).schema_arrow.names
+    if fmt == "arrow":
+        return pa.ipc.open_file(file).schema.names
+    raise ValueError(f"Unsupported results format: {fmt}")
+
+
+def read_results_range(file, fmt, offset, limit, columns=None):
+    # Baca baris [offset, offset + limit) dari artifact hasil. Hanya row group /
+    # record batch yang beririsan dengan range dan kolom yang diminta yang dibaca.
+    import pyarrow as pa
+
+    names = results_schema(file, fmt)
+    unknown = [col for col in columns or [] if col not in names]
+    if unknown:
+        raise ValueError(f"Unknown columns: {unknown}. Expected any of: {names}")
+
+    parts = _parquet_parts(file, columns) if fmt == "parquet" else _arrow_parts(file, columns)
+    tables = []
+    start = 0
+    for size, read in parts:
+        end = start + size
+        if end > offset and start < offset + limit:
+            lo = max(offset - start, 0)
+            tables.append(read().slice(lo, min(end, offset + limit) - start - lo))
+        start = end
+        if start >= offset + limit:
+            break
+
+    return pa.concat_tables(tables).to_pylist() if tables else []
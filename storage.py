@@ -0,0 +1,626 @@
+import io
+import json
+import os
+import shutil
+import sqlite3
+import threading
+
+from aggregates import AGGREGATE_FIELDS, compute_aggregates, prediction_delta
+
+
+class PartialWriteError(Exception):
+    # sebagian record (saved pertama, sesuai urutan) sudah tersimpan sebelum error
+    def __init__(self, saved, cause):
+        super().__init__(f"{saved} records saved before the write failed: {cause}")
+        self.saved = saved
+        self.cause = cause
+
+
+def _month_bounds(month_from=None, month_to=None):
+    # rentang bulan (YYYY-MM, inklusif) diubah jadi rentang timestamp ISO
+    lower = month_from
+    upper = None
+    if month_to:
+        year, month = (int(part) for part in month_to.split("-"))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+        upper = f"{year:04d}-{month:02d}"
+    return lower, upper
+
+
+def _aggregate_deltas(records):
+    # gabungkan increment per (user_id, month) agar satu dokumen agregat hanya ditulis sekali
+    deltas = {}
+    for record in records:
+        user_id = record.get("user_id")
+        if not user_id:
+            continue
+        month, delta = prediction_delta(record)
+        row = deltas.setdefault((user_id, month), dict.fromkeys(AGGREGATE_FIELDS, 0))
+        for field, value in delta.items():
+            row[field] += value
+    return deltas
+
+
+def _project(record, fields):
+    if fields is None:
+        return record
+    return {field: record[field] for field in fields if field in record}
+
+
+def page_predictions(store, user_id, limit, fields=None, start_after=None, after_key=None):
+    # Halaman prediksi user urut (timestamp, key dokumen) DESC. Posisi berikutnya =
+    # (timestamp, key) dokumen terakhir, sehingga dokumen dengan timestamp yang sama
+    # (mis. hasil /predict/batch) tidak terlewat dan tidak dibaca ulang.
+    docs = store.query_predictions(
+        user_id=user_id, start_after=start_after, after_key=after_key, limit=limit, fields=fields, with_keys=True
+    )
+    docs = list(docs)
+    rows = [data for _, data in docs]
+    if len(rows) < limit or not rows[-1].get("timestamp"):
+        return rows, None
+    key, data = docs[-1]
+    return rows, (data["timestamp"], key)
+
+
+# Backend Firestore + Firebase Storage (default di production)
+class FirestoreStore:
+    def __init__(self, credentials_json, storage_bucket):
+        import firebase_admin
+        from firebase_admin import credentials, firestore, storage
+
+        cred = credentials.Certificate(json.loads(credentials_json))
+        firebase_admin.initialize_app(cred, {
+            'storageBucket': storage_bucket
+        })
+        self._firestore = firestore
+        self.db = firestore.client()
+        self.bucket = storage.bucket()
+
+    @classmethod
+    def from_client(cls, db, firestore, bucket=None):
+        # client Firestore yang sudah dibuat (mis. emulator lewat FIRESTORE_EMULATOR_HOST)
+        store = cls.__new__(cls)
+        store._firestore = firestore
+        store.db = db
+        store.bucket = bucket
+        return store
+
+    def _aggregate_ref(self, user_id, month):
+        return self.db.collection("dashboard_aggregates").document(f"{user_id}_{month or '_'}")
+
+    def add_prediction(self, record):
+        # dokumen prediksi dan increment agregat ditulis dalam satu batch atomik
+        batch = self.db.batch()
+        batch.set(self.db.collection("predictions").document(), record)
+        user_id = record.get("user_id")
+        if user_id:
+            month, delta = prediction_delta(record)
+            increments = {field: self._firestore.Increment(value) for field, value in delta.items()}
+            batch.set(self._aggregate_ref(user_id, month), {"user_id": user_id, "month": month, **increments}, merge=True)
+        batch.commit()
+
+    def add_predictions(self, records):
+        # batch Firestore maksimal 500 operasi: record + agregat per commit.
+        # Tiap commit atomik, tapi commit berikutnya bisa gagal setelah yang
+        # sebelumnya tersimpan -> PartialWriteError dengan jumlah yang tersimpan.
+        for start in range(0, len(records), 200):
+            chunk = records[start:start + 200]
+            batch = self.db.batch()
+            for record in chunk:
+                batch.set(self.db.collection("predictions").document(), record)
+            for (user_id, month), delta in _aggregate_deltas(chunk).items():
+                increments = {field: self._firestore.Increment(value) for field, value in delta.items()}
+                batch.set(self._aggregate_ref(user_id, month), {"user_id": user_id, "month": month, **increments}, merge=True)
+            try:
+                batch.commit()
+            except Exception as e:
+                if start == 0:
+                    raise
+                raise PartialWriteError(start, e) from e
+
+    def aggregates_for_user(self, user_id):
+        for doc in self.db.collection("dashboard_aggregates").where("user_id", "==", user_id).stream():
+            yield doc.to_dict()
+
+    def replace_aggregates(self, user_id, months):
+        batch = self.db.batch()
+        for doc in self.db.collection("dashboard_aggregates").where("user_id", "==", user_id).stream():
+            batch.delete(doc.reference)
+        for month, row in months.items():
+            batch.set(self._aggregate_ref(user_id, month), {"user_id": user_id, "month": month, **row})
+        batch.commit()
+
+    def prediction_users(self):
+        # hanya field user_id yang dikirim
+        users = set()
+        for doc in self.db.collection("predictions").select(["user_id"]).stream():
+            user_id = doc.to_dict().get("user_id")
+            if user_id:
+                users.add(user_id)
+        return users
+
+    def _count(self, query):
+        return query.count(alias="count").get()[0][0].value
+
+    def _aggregate_bucket(self, query):
+        # Agregasi count/sum di server, setara prediction_delta untuk dokumen yang
+        # ditulis API: /predict dan /predict/batch (is_churn, 1 customer) atau
+        # /upload (total_customers + churn_count, tanpa is_churn)
+        totals = {
+            result.alias: result.value
+            for result in query.count(alias="predictions")
+            .sum("total_customers", alias="total_customers")
+            .sum("churn_count", alias="churn_count")
+            .get()[0]
+        }
+        churned = self._count(query.where("is_churn", "==", True))
+        stayed = self._count(query.where("is_churn", "==", False))
+        return {
+            "customers": totals["total_customers"] + churned + stayed,
+            "churn": churned + totals["churn_count"],
+            "not_churn": stayed + totals["total_customers"] - totals["churn_count"],
+            "predictions": totals["predictions"],
+        }
+
+    def _months_for_user(self, user_id):
+        # skip-scan: satu query per bulan yang ada (butuh index user_id + month)
+        month = ""
+        while True:
+            query = (
+                self.db.collection("predictions")
+                .where("user_id", "==", user_id)
+                .where("month", ">", month)
+                .order_by("month")
+                .select(["month"])
+                .limit(1)
+            )
+            docs = list(query.stream())
+            if not docs:
+                return
+            month = docs[0].to_dict()["month"]
+            yield month
+
+    def aggregate_predictions(self, user_id):
+        base = self.db.collection("predictions").where("user_id", "==", user_id)
+        rest = self._aggregate_bucket(base)
+        for month in self._months_for_user(user_id):
+            row = self._aggregate_bucket(base.where("month", "==", month))
+            for field in AGGREGATE_FIELDS:
+                rest[field] -= row[field]
+            yield {"user_id": user_id, "month": month, **row}
+        # sisa: dokumen tanpa month
+        if rest["predictions"]:
+            yield {"user_id": user_id, "month": "", **rest}
+
+    def query_predictions(self, user_id=None, month_from=None, month_to=None, start_after=None, limit=50, fields=None,
+                          after_key=None, with_keys=False):
+        # start_after + after_key: lanjut setelah dokumen (timestamp, key); with_keys: yield (key, data)
+        query = self.db.collection("predictions")
+        if user_id:
+            query = query.where("user_id", "==", user_id)
+        lower, upper = _month_bounds(month_from, month_to)
+        if lower:
+            query = query.where("timestamp", ">=", lower)
+        if upper:
+            query = query.where("timestamp", "<", upper)
+        query = query.order_by("timestamp", direction=self._firestore.Query.DESCENDING)
+        query = query.order_by("__name__", direction=self._firestore.Query.DESCENDING)
+        if fields is not None:
+            query = query.select(fields)
+        if start_after and after_key is not None:
+            reference = self.db.collection("predictions").document(after_key)
+            query = query.start_after({"timestamp": start_after, "__name__": reference})
+        elif start_after:
+            query = query.start_after({"timestamp": start_after})
+        for doc in query.limit(limit).stream():
+            yield (doc.id, doc.to_dict()) if with_keys else doc.to_dict()
+
+    def get_document(self, collection, doc_id):
+        doc = self.db.collection(collection).document(doc_id).get()
+        return doc.to_dict() if doc.exists else None
+
+    def set_document(self, collection, doc_id, data):
+        self.db.collection(collection).document(doc_id).set(data)
+
+    def increment_document(self, collection, doc_id, increments):
+        self.db.collection(collection).document(doc_id).set(
+            {field: self._firestore.Increment(value) for field, value in increments.items()}, merge=True
+        )
+
+    def _publish(self, blob):
+        blob.make_public()
+        return blob.public_url
+
+    def upload_file(self, path, file, content_type=None):
+        blob = self.bucket.blob(path)
+        blob.upload_from_file(file, content_type=content_type)
+        return self._publish(blob)
+
+    def upload_bytes(self, path, data, content_type=None):
+        blob = self.bucket.blob(path)
+        blob.upload_from_string(data, content_type=content_type)
+        return self._publish(blob)
+
+    def blob_writer(self, path, content_type=None):
+        # upload resumable: data dikirim bertahap selama file ditulis
+        return self.bucket.blob(path).open("wb", content_type=content_type, ignore_flush=True)
+
+    def blob_url(self, path):
+        return self._publish(self.bucket.blob(path))
+
+    def open_blob(self, path):
+        # reader seekable, setiap read mengambil byte range dari Storage
+        blob = self.bucket.get_blob(path)
+        if blob is None:
+            raise FileNotFoundError(path)
+        return blob.open("rb")
+
+    def delete_blob(self, path):
+        self.bucket.blob(path).delete()
+
+
+# Backend lokal: SQLite untuk dokumen + folder lokal untuk file.
+# Dipakai untuk benchmark offline dan deployment kecil tanpa Firebase.
+class LocalStore:
+    def __init__(self, root, base_url="/blobs"):
+        self.root = root
+        self.blob_dir = os.path.join(root, "blobs")
+        self.base_url = base_url.rstrip("/")
+        os.makedirs(self.blob_dir, exist_ok=True)
+        self.db_path = os.path.join(root, "staysense.sqlite3")
+        self._local = threading.local()
+
+        conn = self._conn()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS predictions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id TEXT,
+                timestamp TEXT,
+                month TEXT,
+                data TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_predictions_user ON predictions (user_id, timestamp);
+            CREATE INDEX IF NOT EXISTS idx_predictions_timestamp ON predictions (timestamp);
+            CREATE TABLE IF NOT EXISTS dashboard_aggregates (
+                user_id TEXT NOT NULL,
+                month TEXT NOT NULL,
+                customers INTEGER NOT NULL DEFAULT 0,
+                churn INTEGER NOT NULL DEFAULT 0,
+                not_churn INTEGER NOT NULL DEFAULT 0,
+                predictions INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (user_id, month)
+            );
+            CREATE TABLE IF NOT EXISTS documents (
+                collection TEXT NOT NULL,
+                doc_id TEXT NOT NULL,
+                data TEXT NOT NULL,
+                PRIMARY KEY (collection, doc_id)
+            );
+        """)
+        conn.commit()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def add_prediction(self, record):
+        self.add_predictions([record])
+
+    def add_predictions(self, records):
+        conn = self._conn()
+        with conn:
+            conn.executemany(
+                "INSERT INTO predictions (user_id, timestamp, month, data) VALUES (?, ?, ?, ?)",
+                [
+                    (record.get("user_id"), record.get("timestamp"), record.get("month"), json.dumps(record))
+                    for record in records
+                ],
+            )
+            conn.executemany(
+                """
+                INSERT INTO dashboard_aggregates (user_id, month, customers, churn, not_churn, predictions)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (user_id, month) DO UPDATE SET
+                    customers = customers + excluded.customers,
+                    churn = churn + excluded.churn,
+                    not_churn = not_churn + excluded.not_churn,
+                    predictions = predictions + excluded.predictions
+                """,
+                [
+                    (user_id, month, *(delta[field] for field in AGGREGATE_FIELDS))
+                    for (user_id, month), delta in _aggregate_deltas(records).items()
+                ],
+            )
+
+    def aggregates_for_user(self, user_id):
+        rows = self._conn().execute(
+            f"SELECT month, {', '.join(AGGREGATE_FIELDS)} FROM dashboard_aggregates WHERE user_id = ?", (user_id,)
+        )
+        for month, *values in rows:
+            yield {"user_id": user_id, "month": month, **dict(zip(AGGREGATE_FIELDS, values))}
+
+    def replace_aggregates(self, user_id, months):
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM dashboard_aggregates WHERE user_id = ?", (user_id,))
+            conn.executemany(
+                f"INSERT INTO dashboard_aggregates (user_id, month, {', '.join(AGGREGATE_FIELDS)}) VALUES (?, ?, ?, ?, ?, ?)",
+                [(user_id, month, *(row[field] for field in AGGREGATE_FIELDS)) for month, row in months.items()],
+            )
+
+    def prediction_users(self):
+        rows = self._conn().execute("SELECT DISTINCT user_id FROM predictions WHERE user_id IS NOT NULL AND user_id != ''")
+        return {user_id for (user_id,) in rows}
+
+    def aggregate_predictions(self, user_id):
+        # perhitungan prediction_delta dalam SQL, dikelompokkan per month
+        rows = self._conn().execute(
+            """
+            SELECT month, COUNT(*),
+                   SUM(customers),
+                   SUM(CASE WHEN is_churn THEN customers ELSE 0 END) + SUM(COALESCE(churn_count, 0)),
+                   SUM(CASE
+                       WHEN is_churn IS NOT NULL AND NOT is_churn THEN customers
+                       WHEN is_churn IS NULL AND churn_count IS NOT NULL THEN customers - churn_count
+                       ELSE 0 END)
+            FROM (
+                SELECT COALESCE(month, '') AS month,
+                       json_extract(data, '$.is_churn') AS is_churn,
+                       json_extract(data, '$.churn_count') AS churn_count,
+                       COALESCE(json_extract(data, '$.total_customers'), 1) AS customers
+                FROM predictions WHERE user_id = ?
+            )
+            GROUP BY month
+            """,
+            (user_id,),
+        )
+        for month, predictions, customers, churn, not_churn in rows:
+            yield {
+                "user_id": user_id,
+                "month": month,
+                "customers": customers,
+                "churn": churn,
+                "not_churn": not_churn,
+                "predictions": predictions,
+            }
+
+    def query_predictions(self, user_id=None, month_from=None, month_to=None, start_after=None, limit=50, fields=None,
+                          after_key=None, with_keys=False):
+        conditions = []
+        params = []
+        if user_id:
+            conditions.append("user_id = ?")
+            params.append(user_id)
+        lower, upper = _month_bounds(month_from, month_to)
+        if lower:
+            conditions.append("timestamp >= ?")
+            params.append(lower)
+        if upper:
+            conditions.append("timestamp < ?")
+            params.append(upper)
+        if start_after and after_key is not None:
+            conditions.append("(timestamp < ? OR (timestamp = ? AND id < ?))")
+            params.extend([start_after, start_after, after_key])
+        elif start_after:
+            conditions.append("timestamp < ?")
+            params.append(start_after)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        rows = self._conn().execute(
+            f"SELECT id, data FROM predictions {where} ORDER BY timestamp DESC, id DESC LIMIT ?", (*params, limit)
+        )
+        for key, data in rows:
+            record = _project(json.loads(data), fields)
+            yield (key, record) if with_keys else record
+
+    def get_document(self, collection, doc_id):
+        row = self._conn().execute(
+            "SELECT data FROM documents WHERE collection = ? AND doc_id = ?", (collection, doc_id)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set_document(self, collection, doc_id, data):
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO documents (collection, doc_id, data) VALUES (?, ?, ?)",
+                (collection, doc_id, json.dumps(data)),
+            )
+
+    def increment_document(self, collection, doc_id, increments):
+        conn = self._conn()
+        with conn:
+            # BEGIN IMMEDIATE agar read-modify-write tidak balapan dengan writer lain
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT data FROM documents WHERE collection = ? AND doc_id = ?", (collection, doc_id)
+            ).fetchone()
+            data = json.loads(row[0]) if row else {}
+            for field, value in increments.items():
+                data[field] = data.get(field, 0) + value
+            conn.execute(
+                "INSERT OR REPLACE INTO documents (collection, doc_id, data) VALUES (?, ?, ?)",
+                (collection, doc_id, json.dumps(data)),
+            )
+
+    def blob_path(self, path):
+        full_path = os.path.abspath(os.path.join(self.blob_dir, path))
+        if not full_path.startswith(os.path.abspath(self.blob_dir) + os.sep):
+            raise ValueError(f"Invalid blob path: {path}")
+        return full_path
+
+    def _prepare(self, path):
+        full_path = self.blob_path(path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        return full_path
+
+    def upload_file(self, path, file, content_type=None):
+        with open(self._prepare(path), "wb") as out:
+            shutil.copyfileobj(file, out)
+        return f"{self.base_url}/{path}"
+
+    def upload_bytes(self, path, data, content_type=None):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        with open(self._prepare(path), "wb") as out:
+            out.write(data)
+        return f"{self.base_url}/{path}"
+
+    def blob_writer(self, path, content_type=None):
+        return open(self._prepare(path), "wb")
+
+    def blob_url(self, path):
+        return f"{self.base_url}/{path}"
+
+    def open_blob(self, path):
+        return open(self.blob_path(path), "rb")
+
+    def delete_blob(self, path):
+        os.remove(self.blob_path(path))
+
+
+class _MemoryBlobWriter(io.BytesIO):
+    def __init__(self, blobs, path):
+        super().__init__()
+        self._blobs = blobs
+        self._path = path
+
+    def close(self):
+        if not self.closed:
+            self._blobs[self._path] = self.getvalue()
+        super().close()
+
+
+# Pengganti Firestore/Storage di memori (satu proses), tanpa jaringan dan tanpa
+# disk. Dipakai benchmark (bench.py) agar hasilnya tidak bergantung pada Firebase.
+class MemoryStore:
+    def __init__(self, base_url="/blobs"):
+        self.base_url = base_url.rstrip("/")
+        self._predictions = []
+        self._aggregates = {}
+        self._documents = {}
+        self.blobs = {}
+        self._lock = threading.Lock()
+
+    def add_prediction(self, record):
+        self.add_predictions([record])
+
+    def add_predictions(self, records):
+        with self._lock:
+            self._predictions.extend(dict(record) for record in records)
+            for (user_id, month), delta in _aggregate_deltas(records).items():
+                row = self._aggregates.setdefault((user_id, month), dict.fromkeys(AGGREGATE_FIELDS, 0))
+                for field, value in delta.items():
+                    row[field] += value
+
+    def aggregates_for_user(self, user_id):
+        with self._lock:
+            rows = [(month, dict(row)) for (uid, month), row in self._aggregates.items() if uid == user_id]
+        for month, row in rows:
+            yield {"user_id": user_id, "month": month, **row}
+
+    def replace_aggregates(self, user_id, months):
+        with self._lock:
+            for key in [key for key in self._aggregates if key[0] == user_id]:
+                del self._aggregates[key]
+            for month, row in months.items():
+                self._aggregates[(user_id, month)] = {field: row[field] for field in AGGREGATE_FIELDS}
+
+    def predictions_for_user(self, user_id):
+        with self._lock:
+            records = [record for record in self._predictions if record.get("user_id") == user_id]
+        for record in records:
+            yield dict(record)
+
+    def prediction_users(self):
+        with self._lock:
+            return {record.get("user_id") for record in self._predictions if record.get("user_id")}
+
+    def aggregate_predictions(self, user_id):
+        months = compute_aggregates(self.predictions_for_user(user_id)).get(user_id, {})
+        for month, row in months.items():
+            yield {"user_id": user_id, "month": month, **row}
+
+    def query_predictions(self, user_id=None, month_from=None, month_to=None, start_after=None, limit=50, fields=None,
+                          after_key=None, with_keys=False):
+        lower, upper = _month_bounds(month_from, month_to)
+        # key = posisi insert, seperti id di LocalStore
+        with self._lock:
+            records = sorted(
+                enumerate(self._predictions), key=lambda item: (item[1].get("timestamp") or "", item[0]), reverse=True
+            )
+        count = 0
+        for key, record in records:
+            if count >= limit:
+                return
+            timestamp = record.get("timestamp") or ""
+            if user_id and record.get("user_id") != user_id:
+                continue
+            if (lower and timestamp < lower) or (upper and timestamp >= upper):
+                continue
+            if start_after and after_key is not None and (timestamp, key) >= (start_after, after_key):
+                continue
+            if start_after and after_key is None and timestamp >= start_after:
+                continue
+            count += 1
+            record = _project(dict(record), fields)
+            yield (key, record) if with_keys else record
+
+    def get_document(self, collection, doc_id):
+        with self._lock:
+            data = self._documents.get((collection, doc_id))
+        return json.loads(json.dumps(data)) if data is not None else None
+
+    def set_document(self, collection, doc_id, data):
+        with self._lock:
+            self._documents[(collection, doc_id)] = json.loads(json.dumps(data))
+
+    def increment_document(self, collection, doc_id, increments):
+        with self._lock:
+            data = self._documents.setdefault((collection, doc_id), {})
+            for field, value in increments.items():
+                data[field] = data.get(field, 0) + value
+
+    def upload_file(self, path, file, content_type=None):
+        return self.upload_bytes(path, file.read(), content_type)
+
+    def upload_bytes(self, path, data, content_type=None):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        self.blobs[path] = bytes(data)
+        return self.blob_url(path)
+
+    def blob_writer(self, path, content_type=None):
+        return _MemoryBlobWriter(self.blobs, path)
+
+    def blob_url(self, path):
+        return f"{self.base_url}/{path}"
+
+    def open_blob(self, path):
+        if path not in self.blobs:
+            raise FileNotFoundError(path)
+        return io.BytesIO(self.blobs[path])
+
+    def delete_blob(self, path):
+        self.blobs.pop(path, None)
+
+
+def create_store():
+    backend = os.getenv("STORAGE_BACKEND", "firestore")
+    if backend == "firestore":
+        return FirestoreStore(
+            os.getenv("FIREBASE_CREDENTIALS"),
+            os.getenv("FIREBASE_STORAGE_BUCKET", "staysense-624b4.firebasestorage.app"),
+        )
+    if backend == "memory":
+        return MemoryStore(os.getenv("LOCAL_BLOB_BASE_URL", "/blobs"))
+    if backend == "local":
+        return LocalStore(
+            os.getenv("LOCAL_STORAGE_PATH", "local_data"),
+            os.getenv("LOCAL_BLOB_BASE_URL", "/blobs"),
+        )
+    raise ValueError(f"Unknown STORAGE_BACKEND: {backend}")
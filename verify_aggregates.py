@@ -0,0 +1,385 @@
+import argparse
+import copy
+import os
+import random
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+from aggregates import AGGREGATE_FIELDS, backfill, compute_aggregates
+from storage import FirestoreStore, LocalStore, MemoryStore, page_predictions
+
+# Harness pengecekan agregasi server-side (aggregate_predictions) dan paginasi
+# /user/data terhadap perhitungan lama (loop prediction_delta atas semua dokumen).
+#
+#   python verify_aggregates.py                 # Firestore stand-in di memori + local + memory
+#   FIRESTORE_EMULATOR_HOST=localhost:8080 python verify_aggregates.py --emulator
+#
+# Stand-in Firestore di bawah meniru semantik query yang dipakai FirestoreStore:
+# filter where, order_by (termasuk "__name__"; dokumen tanpa field diabaikan, tie-break nama dokumen),
+# start_at/start_after, select, limit, count/sum aggregation, batch dan Increment.
+
+
+class _Increment:
+    def __init__(self, value):
+        self.value = value
+
+
+class _Query:
+    ASCENDING = "ASCENDING"
+    DESCENDING = "DESCENDING"
+
+
+class FakeFirestoreModule:
+    Increment = _Increment
+    Query = _Query
+
+
+_MISSING = object()
+
+
+def _same(a, b):
+    if isinstance(a, bool) or isinstance(b, bool):
+        return type(a) is type(b) and a == b
+    return a == b
+
+
+def _comparable(a, b):
+    if isinstance(a, bool) or isinstance(b, bool):
+        return type(a) is type(b)
+    if isinstance(a, (int, float)) and isinstance(b, (int, float)):
+        return True
+    return type(a) is type(b)
+
+
+def _matches(value, op, target):
+    if value is _MISSING:
+        return False
+    if op == "==":
+        return _same(value, target)
+    if op == "!=":
+        return value is not None and not _same(value, target)
+    if not _comparable(value, target):
+        return False
+    return {">": value > target, ">=": value >= target, "<": value < target, "<=": value <= target}[op]
+
+
+class _Snapshot:
+    def __init__(self, reference, data):
+        self.reference = reference
+        self.id = reference.id
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self):
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+
+class _DocumentRef:
+    def __init__(self, db, collection, doc_id):
+        self._db = db
+        self.collection = collection
+        self.id = doc_id
+
+    def set(self, data, merge=False):
+        self._db._apply_set(self, data, merge)
+
+    def get(self):
+        return _Snapshot(self, self._db._docs[self.collection].get(self.id))
+
+
+def _order_value(item, field):
+    doc_id, data = item
+    return doc_id if field == "__name__" else data[field]
+
+
+class _AggregationResult:
+    def __init__(self, alias, value):
+        self.alias = alias
+        self.value = value
+
+
+class _AggregationQuery:
+    def __init__(self, query):
+        self._query = query
+        self._aggregations = []
+
+    def count(self, alias):
+        self._aggregations.append((alias, None))
+        return self
+
+    def sum(self, field, alias):
+        self._aggregations.append((alias, field))
+        return self
+
+    def get(self):
+        self._query._db.stats["aggregation_queries"] += 1
+        docs = self._query._matching()
+        results = []
+        for alias, field in self._aggregations:
+            if field is None:
+                results.append(_AggregationResult(alias, len(docs)))
+                continue
+            values = [data.get(field) for _, data in docs]
+            total = sum(v for v in values if isinstance(v, (int, float)) and not isinstance(v, bool))
+            results.append(_AggregationResult(alias, total))
+        return [results]
+
+
+class _CollectionQuery:
+    def __init__(self, db, collection, filters=(), orders=(), fields=None, start=None, limit=None):
+        self._db = db
+        self._collection = collection
+        self._filters = tuple(filters)
+        self._orders = tuple(orders)
+        self._fields = fields
+        self._start = start
+        self._limit = limit
+
+    def _copy(self, **changes):
+        state = dict(filters=self._filters, orders=self._orders, fields=self._fields, start=self._start, limit=self._limit)
+        state.update(changes)
+        return _CollectionQuery(self._db, self._collection, **state)
+
+    def document(self, doc_id=None):
+        if doc_id is None:
+            self._db.auto_id += 1
+            doc_id = f"doc{self._db.auto_id:08d}"
+        return _DocumentRef(self._db, self._collection, doc_id)
+
+    def where(self, field, op, value):
+        return self._copy(filters=self._filters + ((field, op, value),))
+
+    def order_by(self, field, direction=_Query.ASCENDING):
+        return self._copy(orders=self._orders + ((field, direction),))
+
+    def select(self, fields):
+        return self._copy(fields=list(fields))
+
+    def start_at(self, values):
+        return self._copy(start=(values, True))
+
+    def start_after(self, values):
+        return self._copy(start=(values, False))
+
+    def limit(self, count):
+        return self._copy(limit=count)
+
+    def count(self, alias):
+        return _AggregationQuery(self).count(alias)
+
+    def _matching(self):
+        docs = []
+        order_fields = [field for field, _ in self._orders if field != "__name__"]
+        for doc_id, data in self._db._docs[self._collection].items():
+            if not all(_matches(data.get(field, _MISSING), op, value) for field, op, value in self._filters):
+                continue
+            if any(field not in data for field in order_fields):
+                continue
+            docs.append((doc_id, data))
+
+        # urutan Firestore: field order_by lalu nama dokumen (arah mengikuti order terakhir)
+        descending_name = bool(self._orders) and self._orders[-1][1] == _Query.DESCENDING
+        docs.sort(key=lambda item: item[0], reverse=descending_name)
+        for field, direction in reversed(self._orders):
+            docs.sort(key=lambda item: _order_value(item, field), reverse=direction == _Query.DESCENDING)
+
+        if self._start is not None:
+            values, inclusive = self._start
+            kept = []
+            for doc_id, data in docs:
+                position = 0
+                for field, direction in self._orders:
+                    if field not in values:
+                        break
+                    value, target = _order_value((doc_id, data), field), values[field]
+                    if isinstance(target, _DocumentRef):
+                        target = target.id
+                    if value != target:
+                        after = value < target if direction == _Query.DESCENDING else value > target
+                        position = 1 if after else -1
+                        break
+                if position > 0 or (position == 0 and inclusive):
+                    kept.append((doc_id, data))
+            docs = kept
+        if self._limit is not None:
+            docs = docs[:self._limit]
+        return docs
+
+    def stream(self):
+        for doc_id, data in self._matching():
+            self._db.stats["documents_read"] += 1
+            if self._fields is not None:
+                data = {field: data[field] for field in self._fields if field in data}
+            yield _Snapshot(_DocumentRef(self._db, self._collection, doc_id), data)
+
+
+class _Batch:
+    def __init__(self, db):
+        self._db = db
+        self._ops = []
+
+    def set(self, reference, data, merge=False):
+        self._ops.append(("set", reference, data, merge))
+
+    def delete(self, reference):
+        self._ops.append(("delete", reference, None, False))
+
+    def commit(self):
+        self._db.stats["commits"] += 1
+        for op, reference, data, merge in self._ops:
+            if op == "set":
+                self._db._apply_set(reference, data, merge)
+            else:
+                self._db._docs[reference.collection].pop(reference.id, None)
+
+
+class FakeFirestoreClient:
+    def __init__(self):
+        self._docs = {}
+        self.auto_id = 0
+        self.stats = {"documents_read": 0, "aggregation_queries": 0, "commits": 0}
+
+    def collection(self, name):
+        self._docs.setdefault(name, {})
+        return _CollectionQuery(self, name)
+
+    def batch(self):
+        return _Batch(self)
+
+    def _apply_set(self, reference, data, merge):
+        docs = self._docs.setdefault(reference.collection, {})
+        current = dict(docs.get(reference.id, {})) if merge else {}
+        for field, value in data.items():
+            if isinstance(value, _Increment):
+                value = current.get(field, 0) + value.value
+            current[field] = copy.deepcopy(value)
+        docs[reference.id] = current
+
+
+def sample_records(users, count, seed=0):
+    # campuran dokumen /predict, /predict/batch (timestamp sama), /upload dan dokumen lama tanpa month
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    records = []
+    while len(records) < count:
+        user_id = rng.choice(users)
+        timestamp = start + timedelta(minutes=rng.randrange(0, 60 * 24 * 400))
+        base = {"user_id": user_id, "timestamp": timestamp.isoformat(), "month": timestamp.strftime("%Y-%m")}
+        kind = rng.random()
+        if kind < 0.4:
+            records.append({**base, "input_source": "manual", "is_churn": rng.random() < 0.3,
+                            "rate": rng.random(), "customer_data": {"city": "x", "age": rng.randrange(18, 80)}})
+        elif kind < 0.6:
+            for _ in range(rng.randrange(2, 12)):
+                records.append({**base, "input_source": "batch", "is_churn": rng.random() < 0.3,
+                                "rate": rng.random(), "customer_data": {"city": "y"}})
+        elif kind < 0.9:
+            total = rng.randrange(1, 5000)
+            churn = rng.randrange(0, total + 1)
+            records.append({**base, "input_source": "Upload file", "total_customers": total, "churn_count": churn,
+                            "not_churn_count": total - churn, "filename": "data.csv"})
+        elif kind < 0.95:
+            del base["month"]
+            records.append({**base, "input_source": "manual", "is_churn": rng.random() < 0.5, "rate": 0.5})
+        else:
+            base["month"] = ""
+            total = rng.randrange(1, 100)
+            records.append({**base, "input_source": "Upload file", "total_customers": total, "churn_count": total // 3})
+    return records[:count]
+
+
+def _rows(rows):
+    return sorted(
+        (row.get("month", "") or "", tuple(row[field] for field in AGGREGATE_FIELDS)) for row in rows
+    )
+
+
+def _expected(records, user_id):
+    months = compute_aggregates(record for record in records if record.get("user_id") == user_id).get(user_id, {})
+    return sorted((month, tuple(row[field] for field in AGGREGATE_FIELDS)) for month, row in months.items())
+
+
+def check_store(name, store, records, users, page_size):
+    failures = []
+    for start in range(0, len(records), 150):
+        store.add_predictions(records[start:start + 150])
+
+    def check(label, user_id, rows):
+        expected = _expected(records, user_id)
+        rows = _rows(rows)
+        if rows != expected:
+            failures.append(f"{name}: {label} mismatch for {user_id}: {rows} != {expected}")
+
+    for user_id in users:
+        check("aggregate_predictions", user_id, store.aggregate_predictions(user_id))
+        check("materialized aggregates", user_id, store.aggregates_for_user(user_id))
+
+    if store.prediction_users() != set(users):
+        failures.append(f"{name}: prediction_users mismatch")
+
+    backfill(store)
+    for user_id in users:
+        check("backfill", user_id, store.aggregates_for_user(user_id))
+
+    for user_id in users:
+        # semua halaman /user/data harus sama dengan satu query tanpa batas
+        expected = list(store.query_predictions(user_id=user_id, limit=len(records) + 1))
+        pages = []
+        position = None
+        while True:
+            start_after, after_key = position or (None, None)
+            rows, position = page_predictions(store, user_id, page_size, start_after=start_after, after_key=after_key)
+            pages.extend(rows)
+            if position is None:
+                break
+        if pages != expected:
+            failures.append(f"{name}: pagination mismatch for {user_id} ({len(pages)} != {len(expected)} rows)")
+
+        projected, _ = page_predictions(store, user_id, page_size, fields=["timestamp", "rate"])
+        if any(set(row) - {"timestamp", "rate"} for row in projected):
+            failures.append(f"{name}: projection returned extra fields for {user_id}")
+    return failures
+
+
+def emulator_store():
+    from google.cloud import firestore
+
+    client = firestore.Client(project=os.getenv("GCLOUD_PROJECT", "staysense-test"))
+    return FirestoreStore.from_client(client, firestore)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Verify server-side aggregation and /user/data paging")
+    parser.add_argument("--records", type=int, default=3000)
+    parser.add_argument("--users", type=int, default=5)
+    parser.add_argument("--page-size", type=int, default=7)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--emulator", action="store_true", help="pakai Firestore emulator (FIRESTORE_EMULATOR_HOST)")
+    args = parser.parse_args(argv)
+
+    users = [f"user-{i}" for i in range(args.users)]
+    records = sample_records(users, args.records, args.seed)
+
+    fake = FakeFirestoreClient()
+    stores = [("firestore-stand-in", FirestoreStore.from_client(fake, FakeFirestoreModule))]
+    if args.emulator:
+        stores = [("firestore-emulator", emulator_store())]
+    tmp = tempfile.TemporaryDirectory()
+    stores += [("local", LocalStore(tmp.name)), ("memory", MemoryStore())]
+
+    failures = []
+    for name, store in stores:
+        failures += check_store(name, store, copy.deepcopy(records), users, args.page_size)
+
+    print(f"{len(records)} predictions, {len(users)} users, {len(stores)} stores")
+    if not args.emulator:
+        print(f"firestore stand-in: {fake.stats}")
+    for failure in failures:
+        print(f"FAIL {failure}")
+    print("OK" if not failures else f"{len(failures)} failures")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
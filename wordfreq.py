@@ -0,0 +1,39 @@
+import hashlib
+import json
+import re
+from collections import Counter
+
+TOKEN_RE = re.compile(r"\w[\w']+")
+
+
+# Tokenisasi mengikuti aturan default WordCloud (regexp, tanpa angka, tanpa 's)
+def tokenize(text, stopwords):
+    counts = Counter()
+    for token in TOKEN_RE.findall(text.lower()):
+        if token.endswith("'s"):
+            token = token[:-2]
+        if len(token) < 2 or token.isdigit() or token in stopwords:
+            continue
+        counts[token] += 1
+    return counts
+
+
+def merge_frequencies(frequencies, counts, top_k):
+    merged = Counter(frequencies)
+    merged.update(counts)
+    if len(merged) > top_k:
+        # urutkan juga berdasarkan kata agar hasil pruning deterministik
+        merged = sorted(merged.items(), key=lambda item: (-item[1], item[0]))[:top_k]
+    return dict(merged)
+
+
+# Sidik jari distribusi kata yang benar-benar dirender: top max_words kata
+# dengan frekuensi relatif (dibulatkan), ditambah opsi render
+def frequency_fingerprint(frequencies, max_words, options=None, precision=2):
+    top = sorted(frequencies.items(), key=lambda item: (-item[1], item[0]))[:max_words]
+    highest = top[0][1] if top else 1
+    payload = {
+        "words": [[word, round(count / highest, precision)] for word, count in top],
+        "options": options or {},
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
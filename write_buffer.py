@@ -0,0 +1,159 @@
+import json
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class BufferFullError(Exception):
+    pass
+
+
+# Write-behind buffer: record prediksi dikumpulkan lalu ditulis sekaligus
+# (flush) jika jumlahnya mencapai max_batch atau sudah menunggu flush_interval_ms.
+# Jika buffer penuh, add() menunggu hingga block_timeout lalu menolak; record
+# tidak pernah dibuang.
+class WriteBuffer:
+    def __init__(self, flush_fn, max_batch=400, flush_interval_ms=200, max_pending=10000,
+                 block_timeout=5.0, on_flushed=None, retry_interval=1.0):
+        self.flush_fn = flush_fn
+        self.on_flushed = on_flushed
+        self.max_batch = max(1, int(max_batch))
+        self.flush_interval = max(0.0, float(flush_interval_ms)) / 1000.0
+        self.max_pending = max(1, int(max_pending))
+        self.block_timeout = block_timeout
+        self.retry_interval = retry_interval
+        self._pending = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._stats = {
+            "flushes": 0,
+            "records_flushed": 0,
+            "last_flush_size": 0,
+            "max_flush_size": 0,
+            "flush_ms_total": 0.0,
+            "flush_ms_max": 0.0,
+            "flush_errors": 0,
+            "rejected": 0,
+            "lost": 0,
+        }
+        self._thread = threading.Thread(target=self._run, name="prediction-writer", daemon=True)
+        self._thread.start()
+
+    def add(self, record):
+        with self._cond:
+            if self._closed:
+                raise BufferFullError("Prediction writer is shut down")
+            deadline = None if self.block_timeout is None else time.monotonic() + self.block_timeout
+            while len(self._pending) >= self.max_pending:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    self._stats["rejected"] += 1
+                    raise BufferFullError("Prediction write buffer is full, try again later")
+                self._cond.wait(remaining)
+            self._pending.append(record)
+            if len(self._pending) >= self.max_batch:
+                self._cond.notify_all()
+
+    def _take_batch(self):
+        with self._cond:
+            while not self._pending and not self._closed:
+                self._cond.wait()
+            # tunggu batch terisi atau batas waktu tercapai
+            deadline = time.monotonic() + self.flush_interval
+            while len(self._pending) < self.max_batch and not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            return [self._pending.popleft() for _ in range(min(self.max_batch, len(self._pending)))]
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            if not batch:
+                if self._closed:
+                    return
+                continue
+            remaining = self._flush(batch)
+            if remaining:
+                # gagal: kembalikan yang belum tertulis ke depan antrian dan coba lagi nanti
+                with self._cond:
+                    self._pending.extendleft(reversed(remaining))
+                    closed = self._closed
+                if closed:
+                    return
+                time.sleep(self.retry_interval)
+
+    def _flush(self, batch):
+        # mengembalikan record yang belum tertulis (kosong jika berhasil)
+        started = time.perf_counter()
+        try:
+            self.flush_fn(batch)
+        except Exception as e:
+            # PartialWriteError: sebagian awal batch sudah tersimpan, jangan ditulis ulang
+            saved = getattr(e, "saved", 0)
+            with self._cond:
+                self._stats["flush_errors"] += 1
+                self._stats["records_flushed"] += saved
+            if saved and self.on_flushed is not None:
+                self.on_flushed(batch[:saved])
+            return batch[saved:]
+
+        elapsed_ms = (time.perf_counter() - started) * 1000.0
+        with self._cond:
+            stats = self._stats
+            stats["flushes"] += 1
+            stats["records_flushed"] += len(batch)
+            stats["last_flush_size"] = len(batch)
+            stats["max_flush_size"] = max(stats["max_flush_size"], len(batch))
+            stats["flush_ms_total"] += elapsed_ms
+            stats["flush_ms_max"] = max(stats["flush_ms_max"], elapsed_ms)
+            # ada ruang lagi untuk add() yang sedang menunggu
+            self._cond.notify_all()
+        if self.on_flushed is not None:
+            self.on_flushed(batch)
+        return []
+
+    def close(self, timeout=30.0):
+        # dipanggil saat shutdown: sisa record di-flush (dengan retry) sampai timeout habis
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        deadline = time.monotonic() + timeout
+        self._thread.join(timeout)
+        with self._cond:
+            remaining = list(self._pending)
+            self._pending.clear()
+
+        while remaining:
+            failed = self._flush(remaining[:self.max_batch])
+            remaining = failed + remaining[self.max_batch:]
+            if failed:
+                if time.monotonic() + self.retry_interval >= deadline:
+                    break
+                time.sleep(self.retry_interval)
+
+        if remaining:
+            # storage tetap gagal sampai timeout: record ditulis ke log agar bisa dipulihkan
+            with self._cond:
+                self._stats["lost"] += len(remaining)
+            logger.error(
+                "Prediction writer shut down with %d unwritten records: %s",
+                len(remaining), json.dumps(remaining, default=str),
+            )
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats["queue_depth"] = len(self._pending)
+        stats["avg_flush_size"] = round(stats["records_flushed"] / stats["flushes"], 2) if stats["flushes"] else 0
+        stats["avg_flush_ms"] = round(stats["flush_ms_total"] / stats["flushes"], 3) if stats["flushes"] else 0
+        stats["max_batch"] = self.max_batch
+        stats["flush_interval_ms"] = self.flush_interval * 1000.0
+        stats["max_pending"] = self.max_pending
+        return stats